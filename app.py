@@ -1,34 +1,47 @@
 import streamlit as st
-from streamlit_webrtc import webrtc_streamer, VideoTransformerBase
+from streamlit_webrtc import webrtc_streamer, VideoProcessorBase
 import av
-import numpy as np
-from PIL import Image
 import uuid
 import logging
-from helpers.face_utils import get_face_embedding
+from collections import deque
+from helpers.face_utils import embed_enrolment_burst, start_warm_up
 from helpers.db_utils import register_student
+from helpers.frame_ingest import FrameIngest, save_snapshot
+from helpers.metrics import start_metrics_server
 from helpers.validation import validate_student_input
-from config import FACES_DIR
+from config import ENROLMENT_FRAME_STRIDE, ENROLMENT_SAMPLES, FACES_DIR
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Load the face models while the page renders
+start_warm_up()
+start_metrics_server()
+
 # Initialize session state
 if 'registration_step' not in st.session_state:
     st.session_state.registration_step = 'form'
 if 'form_data' not in st.session_state:
     st.session_state.form_data = None
 
-class FaceCapture(VideoTransformerBase):
+class FaceCapture(VideoProcessorBase):
     def __init__(self):
+        self.ingest = FrameIngest()
         self.frame = None
         self.capture_requested = False
+        # Recent frames, spaced out so the enrolment burst sees some variation
+        self.burst = deque(maxlen=ENROLMENT_SAMPLES)
+        self._frame_count = 0
 
-    def transform(self, frame: av.VideoFrame) -> np.ndarray:
-        img = frame.to_ndarray(format="bgr24")
+    def recv(self, frame: av.VideoFrame) -> av.VideoFrame:
+        img = self.ingest.decode(frame)
         self.frame = img
-        return img
+        if self._frame_count % ENROLMENT_FRAME_STRIDE == 0:
+            self.burst.append(img)
+        self._frame_count += 1
+        # The frame is shown unchanged, so it is not re-encoded
+        return frame
 
 def registration_form():
     """Display and handle registration form"""
@@ -61,32 +74,33 @@ def face_capture():
 
     ctx = webrtc_streamer(
         key="register",
-        video_transformer_factory=FaceCapture,
+        video_processor_factory=FaceCapture,
         media_stream_constraints={"video": True, "audio": False},
         async_processing=True
     )
 
-    if ctx.video_transformer:
+    if ctx.video_processor:
         col1, col2 = st.columns([1, 1])
         
         with col1:
             if st.button("✅ Capture Face"):
                 try:
-                    frame = ctx.video_transformer.frame
-                    if frame is None:
+                    frame = ctx.video_processor.frame
+                    burst = list(ctx.video_processor.burst)
+                    if frame is None or not burst:
                         st.error("No frame captured. Please ensure your camera is working.")
                         return
 
-                    # Get face embedding first
-                    emb = get_face_embedding(frame)
-                    if emb is None:
-                        st.error("⚠️ No face detected. Please ensure your face is clearly visible.")
+                    # Embed the whole burst in one pass before saving anything
+                    centroid, samples, reason = embed_enrolment_burst(burst)
+                    if centroid is None:
+                        st.error(f"⚠️ {reason}. Please ensure your face is clearly visible.")
                         return
 
-                    # Save image
+                    # Save image in the background
                     filename = f"{uuid.uuid4().hex}.jpg"
                     filepath = FACES_DIR / filename
-                    Image.fromarray(frame).save(filepath)
+                    save_snapshot(frame, filepath)
 
                     # Register student
                     success, message = register_student(
@@ -94,7 +108,8 @@ def face_capture():
                         st.session_state.form_data["matric_no"],
                         st.session_state.form_data["department"],
                         str(filepath),
-                        emb.tolist()
+                        centroid.tolist(),
+                        samples.tolist()
                     )
 
                     if success:
@@ -12,11 +12,108 @@ FACES_DIR.mkdir(parents=True, exist_ok=True)
 # File paths
 STUDENT_CSV = DATA_DIR / "students.csv"
 ATTENDANCE_CSV = DATA_DIR / "attendance.csv"
+EMBEDDING_STORE = DATA_DIR / "students.emb"
+ANN_INDEX_PATH = DATA_DIR / "students.ann"
+SAMPLE_STORE = DATA_DIR / "samples.emb"
+SAMPLE_OWNERS_CSV = DATA_DIR / "samples.csv"
+SQLITE_DB = DATA_DIR / "attendance.db"
+ATTENDANCE_JOURNAL = DATA_DIR / "attendance.journal"  # check-ins accepted but not yet stored, one file per process
+ANALYTICS_DIR = DATA_DIR / "analytics"  # Parquet partitions and aggregates for the history page
+# Served by Streamlit's static file serving, so downloads never pass through a script run
+EXPORT_DIR = BASE_DIR / "static" / "exports"
+EXPORT_URL = "app/static/exports"
+EXPORT_MAX_AGE = 3600  # seconds an export stays downloadable
+
+# Storage backend: "csv" or "sqlite"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "csv")
+
+# Record columns shared by every storage backend
+STUDENT_COLUMNS = ["Name", "Matric No", "Department", "Image Path"]
+ATTENDANCE_COLUMNS = ["Name", "Matric No", "Date", "Time", "Status"]
 
 # Face recognition settings
 FACE_MATCH_THRESHOLD = 0.55
 FACE_DETECTION_CONFIDENCE = 0.9
 MAX_RETRY_ATTEMPTS = 3
+EMBEDDING_DIM = 512
+MATCH_TOP_K = 5  # centroid candidates refined against per-sample embeddings
+EMBEDDING_BATCH_SIZE = 32  # face crops per InceptionResnetV1 forward pass
+MODEL_WARMUP = True  # load and warm the face models in the background on page load
+
+# Embedding inference backend: "eager", "torchscript", "int8" or "onnx"
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "eager")
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "0"))  # 0 keeps torch's default
+MODEL_CACHE_DIR = DATA_DIR / "models"
+BACKEND_PARITY_TOLERANCE = 0.02  # max cosine distance drift against the fp32 reference
+BACKEND_PARITY_FACES = 8  # enrolled photos whose face crops backends are checked on
+
+# Where embeddings are computed: "local", "batched" (shared in-process micro-batcher)
+# or "client" (python -m helpers.inference_server owns the model)
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "local")
+INFERENCE_SERVER_URL = os.environ.get("INFERENCE_SERVER_URL", "http://127.0.0.1:8765")
+INFERENCE_BATCH_WINDOW = 0.005  # seconds a micro-batch waits for more requests
+INFERENCE_MAX_BATCH = 32  # face crops per micro-batch
+INFERENCE_TIMEOUT = 10.0  # seconds per request to the inference server
+
+# Content-addressed cache of embeddings for repeated face crops
+EMBEDDING_CACHE_SIZE = 4096  # entries kept in memory, 0 disables the cache
+EMBEDDING_CACHE_DISK = os.environ.get("EMBEDDING_CACHE_DISK", "0") == "1"
+EMBEDDING_CACHE_DIR = DATA_DIR / "embedding_cache"
+
+# Multi-sample enrolment
+ENROLMENT_SAMPLES = 8  # frames captured per registration burst
+ENROLMENT_FRAME_STRIDE = 3  # keep every Nth camera frame so samples differ
+ENROLMENT_MIN_SAMPLES = 3  # usable samples required after outlier removal
+ENROLMENT_OUTLIER_DISTANCE = 0.3  # cosine distance from the centroid
+
+# Approximate nearest-neighbour search for large galleries. Off until it pays for itself:
+# in `python -m helpers.benchmark --skip-models` (NumPy IVF, nprobe 8) ANN p50 was
+# 0.43 vs 0.85 ms exact at 6k students, 0.70 vs 2.06 ms at 20k and 2.8 vs 24 ms at 100k,
+# but ANN alone found the exact below-threshold match for only 0.89, 0.85 and 0.66 of
+# queries. Its misses land near 0.83, past ANN_FALLBACK_MARGIN, so they became "no match".
+ANN_ENABLED = False
+ANN_BACKEND = "auto"  # "ivf" (NumPy), "hnsw" (hnswlib) or "auto" to prefer hnswlib when installed
+ANN_MIN_GALLERY_SIZE = 5000  # smaller galleries are searched exactly
+ANN_NPROBE = 8  # IVF lists scanned per query
+ANN_CANDIDATES = 64  # HNSW neighbours fetched per query
+ANN_SAVE_ROWS = 500  # rows added to a loaded index before it is persisted again
+ANN_FALLBACK_MARGIN = 0.1  # ANN results this far past FACE_MATCH_THRESHOLD are re-checked exactly
+
+# Shared in-memory gallery
+GALLERY_POLL_INTERVAL = 2.0  # seconds between checks for students enrolled by other processes
+
+# Cheap quality gate run before the full embedding pass
+PREFILTER_ENABLED = True
+PREFILTER_SCALE = 0.5  # detector runs on the frame downscaled by this factor
+PREFILTER_MIN_FACE_SIZE = 20  # in downscaled pixels
+PREFILTER_FACTOR = 0.6
+MIN_FACE_SIZE = 60  # shortest face side in original pixels
+MIN_SHARPNESS = 50.0  # variance of the Laplacian over the face region
+MIN_BRIGHTNESS = 40
+MAX_BRIGHTNESS = 220
+
+# Continuous recognition settings
+STREAM_CONFIRM_FRAMES = 3  # consecutive frames that must agree before auto-marking
+STREAM_QUEUE_SIZE = 1
+FRAME_POOL_SIZE = 4  # reusable RGB buffers per stream, for frames with padded rows
+
+# Frame-to-frame face tracking in the stream
+TRACK_IOU_THRESHOLD = 0.3  # minimum box overlap to continue a track
+TRACK_DRIFT_IOU = 0.5  # re-embed once a box overlaps its last embedded position less than this
+TRACK_REFRESH_FRAMES = 15  # re-embed a settled track at least this often
+TRACK_MAX_LOST = 5  # frames a track survives without a detection
+
+# Attendance log settings
+ATTENDANCE_FSYNC_BATCH = 20
+ATTENDANCE_FSYNC_INTERVAL = 2.0  # seconds
+ATTENDANCE_WRITE_BEHIND = True  # confirm check-ins before the backend write completes
+ATTENDANCE_FLUSH_BATCH = 50  # queued records that trigger an immediate flush
+ATTENDANCE_FLUSH_INTERVAL = 1.0  # seconds between background flushes
+
+# Pipeline metrics
+METRICS_WINDOW = 1024  # recent samples per stage used for percentiles
+METRICS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]  # seconds
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))  # Prometheus /metrics endpoint, 0 disables it
 
 # Validation patterns
 MATRIC_PATTERN = r'^U\d{2}/[A-Z]{3}/[A-Z]{3}/\d{4}$'
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""Date-partitioned Parquet copy of the attendance history with precomputed aggregates.
+
+    analytics/
+        daily.parquet                     Date, Count, Unique Students
+        date=YYYY-MM-DD/records.parquet   the day's attendance rows
+        date=YYYY-MM-DD/students.parquet  Matric No, Name, Count
+        state.json                        backend cursor of the last synced record
+
+sync() pulls only the records appended since the stored cursor, so keeping the
+partitions current costs one rewrite of the touched days per call.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from config import ANALYTICS_DIR, ATTENDANCE_COLUMNS, STORAGE_BACKEND
+from helpers.db_utils import read_attendance_since
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DAILY_COLUMNS = ["Date", "Count", "Unique Students"]
+STUDENT_TOTAL_COLUMNS = ["Matric No", "Name", "Count"]
+_PARTITION_PREFIX = "date="
+
+
+def _write_parquet(df: pd.DataFrame, path):
+    """Write through a temporary file so readers never see a partial file"""
+    tmp = path.with_name(path.name + ".tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+class AttendanceAnalytics:
+    """Parquet partitions of attendance by date, kept in step with the storage backend"""
+
+    def __init__(self, root=ANALYTICS_DIR):
+        self.root = root
+        self.state_path = root / "state.json"
+        self.daily_path = root / "daily.parquet"
+        # Beside the directory, which _reset deletes
+        self.lock_path = root.with_name(root.name + ".lock")
+        self._lock = threading.Lock()
+
+    def _partition(self, date: str):
+        return self.root / f"{_PARTITION_PREFIX}{date}"
+
+    def _load_cursor(self) -> int:
+        if not self.state_path.exists():
+            return 0
+        state = json.loads(self.state_path.read_text())
+        # Cursors are byte offsets for CSV and row ids for SQLite
+        return state["cursor"] if state.get("backend") == STORAGE_BACKEND else -1
+
+    def _save_cursor(self, cursor: int):
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"backend": STORAGE_BACKEND, "cursor": cursor}))
+        os.replace(tmp, self.state_path)
+
+    def _reset(self):
+        if self.root.exists():
+            shutil.rmtree(self.root)
+        self.root.mkdir(parents=True)
+
+    def _merge_day(self, date: str, rows: pd.DataFrame) -> Tuple[int, int]:
+        """Append rows to one day's partition, returning its record and student counts"""
+        partition = self._partition(date)
+        partition.mkdir(exist_ok=True)
+        records_path = partition / "records.parquet"
+        if records_path.exists():
+            rows = pd.concat([pd.read_parquet(records_path), rows], ignore_index=True)
+        # Rows of a sync that failed before saving its cursor are read again
+        rows = rows.drop_duplicates(subset=["Matric No", "Date", "Status"], ignore_index=True)
+        _write_parquet(rows, records_path)
+
+        totals = rows.groupby("Matric No", sort=False).agg(
+            Name=("Name", "last"), Count=("Name", "size")
+        ).reset_index()
+        _write_parquet(totals[STUDENT_TOTAL_COLUMNS], partition / "students.parquet")
+        return len(rows), len(totals)
+
+    def _sync_locked(self) -> int:
+        cursor = self._load_cursor()
+        if cursor < 0 or not self.root.exists():
+            self._reset()
+            cursor = 0
+        try:
+            new_rows, next_cursor = read_attendance_since(cursor)
+        except ValueError:
+            # The source was replaced or truncated, so start over
+            logger.info("Attendance source changed, rebuilding analytics")
+            self._reset()
+            new_rows, next_cursor = read_attendance_since(0)
+
+        if not new_rows.empty:
+            new_rows = new_rows[ATTENDANCE_COLUMNS].astype(str)
+            touched = pd.DataFrame(
+                [(date, *self._merge_day(date, rows))
+                 for date, rows in new_rows.groupby("Date", sort=True)],
+                columns=DAILY_COLUMNS
+            )
+            daily = self.load_daily()
+            daily = pd.concat([daily[~daily["Date"].isin(touched["Date"])], touched])
+            _write_parquet(daily.sort_values("Date")[DAILY_COLUMNS], self.daily_path)
+        if next_cursor != cursor:
+            self._save_cursor(next_cursor)
+        return len(new_rows)
+
+    def sync(self) -> int:
+        """Fold newly logged attendance into the partitions, returning the number of new rows"""
+        with self._lock:
+            try:
+                # Also excludes the CLIs and other servers, which would merge the same rows again
+                self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.lock_path, "a") as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    return self._sync_locked()
+
+            except Exception as e:
+                logger.error(f"Error syncing attendance analytics: {str(e)}")
+                return 0
+
+    def load_daily(self) -> pd.DataFrame:
+        """Per-day record and unique student counts for the whole history"""
+        if not self.daily_path.exists():
+            return pd.DataFrame({"Date": pd.Series(dtype=str), "Count": pd.Series(dtype="int64"),
+                                 "Unique Students": pd.Series(dtype="int64")})
+        return pd.read_parquet(self.daily_path)
+
+    def partition_dates(self, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+        """Dates with a partition inside the inclusive ISO date range"""
+        if not self.root.exists():
+            return []
+        dates = sorted(
+            p.name[len(_PARTITION_PREFIX):] for p in self.root.iterdir()
+            if p.is_dir() and p.name.startswith(_PARTITION_PREFIX)
+        )
+        return [d for d in dates if (start is None or d >= start) and (end is None or d <= end)]
+
+    def daily_version(self) -> int:
+        return self.daily_path.stat().st_mtime_ns if self.daily_path.exists() else 0
+
+    def partition_versions(self, start: str, end: str) -> Tuple[Tuple[str, int], ...]:
+        """Modification times of the partitions in range, for use as a cache key"""
+        versions = []
+        for date in self.partition_dates(start, end):
+            path = self._partition(date) / "records.parquet"
+            versions.append((date, path.stat().st_mtime_ns if path.exists() else 0))
+        return tuple(versions)
+
+    def iter_records(self, start: str, end: str, name: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """Attendance rows for the date range, one partition at a time"""
+        filters = [("Name", "==", name)] if name else None
+        for date in self.partition_dates(start, end):
+            yield pd.read_parquet(self._partition(date) / "records.parquet", filters=filters)
+
+    def iter_student_days(self, start: str, end: str) -> Iterator[pd.DataFrame]:
+        """Per-student totals of each day in the range, one partition at a time"""
+        for date in self.partition_dates(start, end):
+            yield pd.read_parquet(self._partition(date) / "students.parquet")
+
+    def load_records(self, start: str, end: str, name: Optional[str] = None) -> pd.DataFrame:
+        """Attendance rows for the date range, reading only the partitions it covers"""
+        frames = list(self.iter_records(start, end, name))
+        if not frames:
+            return pd.DataFrame(columns=ATTENDANCE_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def load_student_totals(self, start: str, end: str) -> pd.DataFrame:
+        """Records per student over the date range, from the per-day aggregates"""
+        frames = list(self.iter_student_days(start, end))
+        if not frames:
+            return pd.DataFrame(columns=STUDENT_TOTAL_COLUMNS)
+        return pd.concat(frames, ignore_index=True).groupby("Matric No", sort=False).agg(
+            Name=("Name", "last"), Count=("Count", "sum")
+        ).reset_index()[STUDENT_TOTAL_COLUMNS]
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_analytics() -> AttendanceAnalytics:
+    """Process-wide analytics store"""
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = AttendanceAnalytics()
+        return _analytics
+
+
+if __name__ == "__main__":
+    analytics = get_analytics()
+    added = analytics.sync()
+    print(f"Synced {added} new records into {len(analytics.partition_dates())} date partitions")
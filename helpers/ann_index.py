@@ -0,0 +1,265 @@
+import fcntl
+import hashlib
+import io
+import logging
+import os
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+
+from config import (ANN_BACKEND, ANN_CANDIDATES, ANN_INDEX_PATH, ANN_NPROBE, EMBEDDING_DIM,
+                    FACE_MATCH_THRESHOLD)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+_ASSIGN_CHUNK = 8192
+_TRAIN_SAMPLE = 20000
+_FINGERPRINT_ROWS = 4096
+
+
+def _replace_file(path, write):
+    """Write a file through a temporary sibling so readers never see it half written"""
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        write(temporary)
+        os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+
+
+@contextmanager
+def _index_lock(index_path):
+    """Serialise an index file between processes, whose gallery watchers all save it"""
+    with open(index_path.with_name(index_path.name + ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def fingerprint(matrix: np.ndarray, rows: int) -> str:
+    """Row count plus a hash of rows spread over the first `rows`, to spot a rewritten store"""
+    digest = hashlib.blake2b(str(rows).encode(), digest_size=16)
+    if rows:
+        picks = np.unique(np.linspace(0, rows - 1, min(rows, _FINGERPRINT_ROWS)).astype(np.int64))
+        digest.update(np.ascontiguousarray(matrix[picks], dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid by inner product, computed in chunks"""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        scores = vectors[start:start + _ASSIGN_CHUNK] @ centroids.T
+        labels[start:start + _ASSIGN_CHUNK] = np.argmax(scores, axis=1)
+    return labels
+
+
+class IVFIndex:
+    """Inverted-file index over normalised vectors with spherical k-means lists"""
+
+    kind = "ivf"
+    suffix = ".ivf.npz"
+
+    def __init__(self, centroids: np.ndarray, nprobe: int = ANN_NPROBE, path=ANN_INDEX_PATH):
+        self.centroids = centroids.astype(np.float32)
+        self.nprobe = min(nprobe, len(centroids))
+        self.path = path.with_suffix(self.suffix)
+        self.lists: List[List[int]] = [[] for _ in range(len(centroids))]
+        self.size = 0
+        # Fingerprint of the gallery rows this index was saved with
+        self.fingerprint: Optional[str] = None
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, iterations: int = 10, seed: int = 0,
+              path=ANN_INDEX_PATH) -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        nlist = max(1, int(np.sqrt(len(vectors))))
+        sample = vectors
+        if len(vectors) > _TRAIN_SAMPLE:
+            sample = vectors[np.sort(rng.choice(len(vectors), _TRAIN_SAMPLE, replace=False))]
+        sample = np.asarray(sample, dtype=np.float32)
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+
+        index = cls(centroids, path=path)
+        index.add(vectors, 0)
+        return index
+
+    def add(self, vectors: np.ndarray, start_id: int):
+        labels = _assign(np.asarray(vectors, dtype=np.float32), self.centroids)
+        for offset, label in enumerate(labels):
+            self.lists[label].append(start_id + offset)
+        self.size += len(labels)
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        scores = self.centroids @ query
+        probe = np.argpartition(-scores, self.nprobe - 1)[:self.nprobe]
+        return np.fromiter((i for c in probe for i in self.lists[c]), dtype=np.int64)
+
+    def save(self, fingerprint: str):
+        labels = np.empty(self.size, dtype=np.int32)
+        for label, ids in enumerate(self.lists):
+            labels[ids] = label
+        buffer = io.BytesIO()
+        np.savez(buffer, centroids=self.centroids, labels=labels, fingerprint=np.array(fingerprint))
+        _replace_file(self.path, lambda path: path.write_bytes(buffer.getvalue()))
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def load(cls, path=ANN_INDEX_PATH) -> Optional["IVFIndex"]:
+        if not path.with_suffix(cls.suffix).exists():
+            return None
+        data = np.load(path.with_suffix(cls.suffix))
+        index = cls(data["centroids"], path=path)
+        for row, label in enumerate(data["labels"]):
+            index.lists[label].append(row)
+        index.size = len(data["labels"])
+        if "fingerprint" in data.files:
+            index.fingerprint = str(data["fingerprint"])
+        return index
+
+
+class HnswIndex:
+    """hnswlib graph index, used when the package is installed"""
+
+    kind = "hnsw"
+    suffix = ".hnsw"
+
+    def __init__(self, dim: int = EMBEDDING_DIM, capacity: int = 1024, path=ANN_INDEX_PATH):
+        self.path = path.with_suffix(self.suffix)
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.init_index(max_elements=capacity, ef_construction=200, M=16)
+        self.index.set_ef(ANN_CANDIDATES)
+        self.fingerprint: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return self.index.get_current_count()
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, path=ANN_INDEX_PATH) -> "HnswIndex":
+        index = cls(capacity=max(2 * len(vectors), 1024), path=path)
+        index.add(vectors, 0)
+        return index
+
+    def add(self, vectors: np.ndarray, start_id: int):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        needed = self.size + len(vectors)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(2 * needed)
+        self.index.add_items(vectors, np.arange(start_id, start_id + len(vectors)))
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        labels, _ = self.index.knn_query(query, k=min(ANN_CANDIDATES, self.size))
+        return labels[0].astype(np.int64)
+
+    def save(self, fingerprint: str):
+        _replace_file(self.path, lambda path: self.index.save_index(str(path)))
+        _replace_file(self.path.with_name(self.path.name + ".fingerprint"),
+                      lambda path: path.write_text(fingerprint))
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def load(cls, path=ANN_INDEX_PATH) -> Optional["HnswIndex"]:
+        if not path.with_suffix(cls.suffix).exists():
+            return None
+        index = cls(path=path)
+        index.index.load_index(str(index.path), max_elements=0)
+        index.index.set_ef(ANN_CANDIDATES)
+        fingerprint_path = index.path.with_name(index.path.name + ".fingerprint")
+        if fingerprint_path.exists():
+            index.fingerprint = fingerprint_path.read_text().strip()
+        return index
+
+
+def _index_class():
+    if ANN_BACKEND == "hnsw" or (ANN_BACKEND == "auto" and hnswlib is not None):
+        if hnswlib is None:
+            logger.error("hnswlib is not installed, using the NumPy IVF index")
+            return IVFIndex
+        return HnswIndex
+    return IVFIndex
+
+
+def load_or_build(matrix: np.ndarray, path=ANN_INDEX_PATH):
+    """Load the persisted index, topping it up or rebuilding it to match the gallery"""
+    cls = _index_class()
+    try:
+        with _index_lock(path.with_suffix(cls.suffix)):
+            index = cls.load(path)
+    except Exception as e:
+        logger.error(f"Error loading ANN index: {str(e)}")
+        index = None
+
+    # Rebuild when the store was rewritten, rows were removed or the gallery quadrupled since training
+    if (index is not None and index.size <= len(matrix)
+            and index.fingerprint != fingerprint(matrix, index.size)):
+        logger.info("Persisted ANN index belongs to other gallery rows, rebuilding it")
+        index = None
+    if index is None or index.size > len(matrix) or 4 * index.size < len(matrix):
+        index = cls.train(matrix, path=path)
+        logger.info(f"Built {index.kind} index over {len(matrix)} embeddings")
+    elif index.size < len(matrix):
+        index.add(matrix[index.size:], index.size)
+    save_index(index, matrix)
+    return index
+
+
+def save_index(index, matrix: np.ndarray):
+    """Persist `index` with the fingerprint of the gallery rows it covers"""
+    with _index_lock(index.path):
+        index.save(fingerprint(matrix, index.size))
+
+
+def recall_queries(matrix: np.ndarray, samples: int, rng: np.random.Generator,
+                   threshold: float = FACE_MATCH_THRESHOLD, low: float = 0.0) -> np.ndarray:
+    """Queries at cosine distances spread evenly from `low` up to `threshold` from enrolled rows"""
+    rows = rng.choice(len(matrix), min(samples, len(matrix)), replace=False)
+    enrolled = np.asarray(matrix[rows], dtype=np.float64)
+    # Random directions orthogonal to each enrolled row
+    directions = rng.standard_normal(enrolled.shape)
+    directions -= np.sum(directions * enrolled, axis=1, keepdims=True) * enrolled
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    cosine = 1.0 - rng.uniform(low, threshold, size=(len(rows), 1))
+    return (cosine * enrolled + np.sqrt(1.0 - cosine ** 2) * directions).astype(np.float32)
+
+
+def measure_recall(gallery, samples: int = 200, seed: int = 0) -> float:
+    """Share of below-threshold exact top-1 matches that the ANN path returns without the exact fallback"""
+    rng = np.random.default_rng(seed)
+    queries = recall_queries(np.asarray(gallery.matrix), samples, rng)
+
+    hits = total = 0
+    for query in queries:
+        exact, distance = gallery.best_match(query, exact=True)
+        if distance >= FACE_MATCH_THRESHOLD:
+            continue
+        approximate, _ = gallery.best_match(query, fallback=False)
+        total += 1
+        hits += approximate is not None and approximate["Matric No"] == exact["Matric No"]
+    return hits / total if total else 1.0
+
+
+if __name__ == "__main__":
+    from helpers.gallery import get_gallery
+
+    gallery = get_gallery()
+    if gallery.index is None:
+        print(f"Gallery of {len(gallery)} students is searched exactly")
+    else:
+        print(f"{gallery.index.kind} recall@1 vs exact search, up to the match threshold: "
+              f"{measure_recall(gallery):.3f} (misses near the threshold fall back to an exact scan)")
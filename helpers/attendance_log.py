@@ -0,0 +1,167 @@
+import atexit
+import csv
+import io
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+
+from config import (ATTENDANCE_COLUMNS, ATTENDANCE_CSV, ATTENDANCE_FSYNC_BATCH,
+                    ATTENDANCE_FSYNC_INTERVAL)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_TAIL_BLOCK = 64 * 1024
+
+
+class AttendanceLog:
+    """Append-only attendance file with an in-memory index of today's keys"""
+
+    def __init__(self, path=ATTENDANCE_CSV, fsync_batch: int = ATTENDANCE_FSYNC_BATCH,
+                 fsync_interval: float = ATTENDANCE_FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._today = None
+        self._keys: Set[Tuple[str, str, str]] = set()
+
+    def _read_today_tail(self, today: str):
+        """Collect today's keys by scanning the file backwards"""
+        self._keys = set()
+        self._today = today
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+
+        with open(self.path, "rb") as f:
+            header = next(csv.reader([f.readline().decode("utf-8")]), ATTENDANCE_COLUMNS)
+            columns = {name: i for i, name in enumerate(header)}
+            data_start = f.tell()
+            position = f.seek(0, os.SEEK_END)
+            remainder = b""
+            while position > data_start:
+                size = min(_TAIL_BLOCK, position - data_start)
+                position -= size
+                f.seek(position)
+                chunk = f.read(size) + remainder
+                lines = chunk.split(b"\n")
+                # The first piece may be a partial line unless we reached the header
+                remainder = lines.pop(0) if position > data_start else b""
+                recent = False
+                for line in reversed(lines):
+                    line = line.strip(b"\r")
+                    if not line:
+                        continue
+                    row = next(csv.reader([line.decode("utf-8")]))
+                    date = row[columns["Date"]]
+                    recent = recent or date >= today
+                    if date == today:
+                        self._keys.add((row[columns["Matric No"]], date, row[columns["Status"]]))
+                # Replayed records of earlier days can follow today's, so one older row
+                # is not the end of today; a whole block without any is
+                if not recent:
+                    return
+
+    def load_today(self):
+        """Rebuild today's duplicate index from the end of the file"""
+        with self._lock:
+            self._read_today_tail(datetime.now().strftime("%Y-%m-%d"))
+
+    def _ensure_today(self, today: str):
+        if self._today is None:
+            self._read_today_tail(today)
+        elif today > self._today:
+            # A new day starts with no marks; late records of earlier days leave it alone
+            self._today = today
+            self._keys = set()
+
+    def is_marked(self, matric_no: str, date: str, status: str) -> bool:
+        with self._lock:
+            self._ensure_today(date)
+            return (matric_no, date, status) in self._keys
+
+    def today_keys(self, today: str) -> Set[Tuple[str, str, str]]:
+        """Keys already written for `today`"""
+        with self._lock:
+            self._ensure_today(today)
+            return set(self._keys) if self._today == today else set()
+
+    def append(self, record: dict) -> bool:
+        """Write a record unless its (matric, date, status) key already exists"""
+        return bool(self.append_many([record], force_sync=False))
+
+    def append_many(self, records: List[dict], force_sync: bool = True) -> List[dict]:
+        """Write every record whose key is new in a single write, returning those written"""
+        with self._lock:
+            added, seen = [], set()
+            for record in records:
+                key = (record["Matric No"], record["Date"], record["Status"])
+                self._ensure_today(record["Date"])
+                if key in self._keys or key in seen:
+                    continue
+                seen.add(key)
+                if record["Date"] == self._today:
+                    self._keys.add(key)
+                added.append(record)
+            if not added:
+                return added
+
+            if self._file is None:
+                new_file = not self.path.exists() or self.path.stat().st_size == 0
+                self._file = open(self.path, "a", newline="", encoding="utf-8")
+                if new_file:
+                    self._file.write(self._format(ATTENDANCE_COLUMNS))
+
+            self._file.write("".join(self._format([r[c] for c in ATTENDANCE_COLUMNS]) for r in added))
+            self._file.flush()
+            self._pending += len(added)
+            if (force_sync or self._pending >= self.fsync_batch
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync_locked()
+            return added
+
+    @staticmethod
+    def _format(values) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerow(values)
+        return buffer.getvalue()
+
+    def _sync_locked(self):
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Force buffered records to disk"""
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_attendance_log: Optional[AttendanceLog] = None
+_log_lock = threading.Lock()
+
+
+def get_attendance_log() -> AttendanceLog:
+    """Process-wide attendance log shared by all sessions"""
+    global _attendance_log
+    with _log_lock:
+        if _attendance_log is None:
+            _attendance_log = AttendanceLog()
+            _attendance_log.load_today()
+            atexit.register(_attendance_log.close)
+        return _attendance_log
@@ -0,0 +1,214 @@
+import atexit
+import csv
+import fcntl
+import io
+import itertools
+import logging
+import os
+import threading
+from typing import List, Optional, Set, Tuple
+
+from config import (ATTENDANCE_COLUMNS, ATTENDANCE_FLUSH_BATCH, ATTENDANCE_FLUSH_INTERVAL,
+                    ATTENDANCE_JOURNAL)
+from helpers.metrics import timed
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Distinguishes queues opened by one process, e.g. in tests and benchmarks
+_instance_ids = itertools.count()
+
+
+class AttendanceQueue:
+    """Write-behind buffer that confirms check-ins before they reach the storage backend.
+
+    Accepted records go to a journal file owned by this queue
+    (`attendance.<pid>-<n>.journal`) and an in-memory batch; a background thread
+    writes batches to the backend on a size or time trigger. A batch being
+    written is kept in `<journal>.flushing` until the backend confirms it.
+    Each queue holds an flock on `attendance.<pid>-<n>.lock` while it runs, so
+    on start-up only journals whose owner has exited are replayed. Backend
+    writes skip keys that already exist, so replaying a batch twice is harmless.
+
+    Duplicates are checked in memory against the keys the backend held when the
+    day started plus this queue's accepted records. A student confirmed by
+    another process later that day is not detected; the backend keeps one record.
+    """
+
+    def __init__(self, backend, journal_path=ATTENDANCE_JOURNAL,
+                 flush_batch: int = ATTENDANCE_FLUSH_BATCH,
+                 flush_interval: float = ATTENDANCE_FLUSH_INTERVAL):
+        self.backend = backend
+        self.base_path = journal_path
+        owner = f"{os.getpid()}-{next(_instance_ids)}"
+        self.journal_path = self._owned_path(owner, journal_path.suffix)
+        self.flushing_path = self._owned_path(owner, journal_path.suffix + ".flushing")
+        self.lock_path = self._owned_path(owner, ".lock")
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._pending: List[dict] = []
+        self._failed: List[dict] = []
+        self._today = None
+        self._keys: Set[Tuple[str, str, str]] = set()
+        self._stopped = False
+
+        # Held until close, marking this queue's journal as live
+        self._owner_lock = open(self.lock_path, "a")
+        fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+        self._recover()
+        self._journal = open(self.journal_path, "a", newline="", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self._thread.start()
+
+    def _read_journal(self, path) -> List[dict]:
+        if not path.exists():
+            return []
+        with open(path, newline="", encoding="utf-8") as f:
+            # A torn last line from a crash is dropped
+            return [dict(zip(ATTENDANCE_COLUMNS, row)) for row in csv.reader(f)
+                    if len(row) == len(ATTENDANCE_COLUMNS)]
+
+    def _owned_path(self, owner: str, suffix: str):
+        return self.base_path.with_name(f"{self.base_path.stem}.{owner}{suffix}")
+
+    def _journal_owners(self) -> Set[str]:
+        """Queues, running or exited, that have journal files on disk"""
+        pattern = f"{self.base_path.stem}.*{self.base_path.suffix}*"
+        prefix = len(self.base_path.stem) + 1
+        return {path.name[prefix:].split(".")[0] for path in self.base_path.parent.glob(pattern)}
+
+    def _recover(self):
+        """Write records journalled by exited queues that never reached the backend"""
+        recovery_lock = self.base_path.with_name(self.base_path.name + ".lock")
+        with open(recovery_lock, "a") as guard:
+            # One queue recovers at a time, so an orphan is replayed once
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            for owner in self._journal_owners():
+                owner_path = self._owned_path(owner, ".lock")
+                with open(owner_path, "a") as held:
+                    if owner_path != self.lock_path:
+                        try:
+                            fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except BlockingIOError:
+                            continue  # its queue is still running
+                    journal = self._owned_path(owner, self.base_path.suffix)
+                    flushing = self._owned_path(owner, self.base_path.suffix + ".flushing")
+                    records = self._read_journal(flushing) + self._read_journal(journal)
+                    if records:
+                        added = self.backend.add_attendance_many(records)
+                        logger.info(f"Recovered {len(records)} journalled attendance records ({added} new)")
+                    flushing.unlink(missing_ok=True)
+                    journal.unlink(missing_ok=True)
+                    if owner_path != self.lock_path:
+                        owner_path.unlink(missing_ok=True)
+
+    def _ensure_today(self, today: str):
+        """Load the day's marked keys with one backend query, so enqueue never waits on storage"""
+        if self._today != today:
+            self._today = today
+            self._keys = set(self.backend.today_keys(today))
+
+    def enqueue(self, record: dict) -> bool:
+        """Accept a record unless it is already marked, without waiting for storage"""
+        key = (record["Matric No"], record["Date"], record["Status"])
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("Attendance queue is closed")
+            self._ensure_today(record["Date"])
+            if key in self._keys:
+                return False
+
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator="\n").writerow([record[c] for c in ATTENDANCE_COLUMNS])
+            # Flushed to the OS so the record survives a crash of this process
+            self._journal.write(buffer.getvalue())
+            self._journal.flush()
+            self._keys.add(key)
+            self._pending.append(record)
+            if len(self._pending) >= self.flush_batch:
+                self._ready.notify()
+            return True
+
+    def _rotate_locked(self) -> List[dict]:
+        """Hand the journalled batch over to the flushing file and start a fresh journal"""
+        batch, self._pending = self._pending, []
+        self._journal.close()
+        if self.flushing_path.exists():
+            # An earlier batch failed and is still waiting
+            with open(self.flushing_path, "a", encoding="utf-8") as f:
+                f.write(self.journal_path.read_text(encoding="utf-8"))
+            self.journal_path.unlink()
+        else:
+            os.replace(self.journal_path, self.flushing_path)
+        self._journal = open(self.journal_path, "a", newline="", encoding="utf-8")
+        return batch
+
+    def flush(self):
+        """Write every accepted record to the backend now"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._failed:
+                    return
+                batch = self._failed + self._rotate_locked()
+            try:
+                with timed("storage_flush"):
+                    self.backend.add_attendance_many(batch)
+                self._failed = []
+                self.flushing_path.unlink(missing_ok=True)
+            except Exception as e:
+                # Kept for the next attempt; the flushing file still holds them
+                self._failed = batch
+                logger.error(f"Error writing {len(batch)} attendance records: {str(e)}")
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopped and len(self._pending) < self.flush_batch:
+                    self._ready.wait(self.flush_interval)
+                stopped = self._stopped
+            self.flush()
+            if stopped:
+                return
+
+    def close(self):
+        """Stop the writer after a final flush"""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._ready.notify()
+        self._thread.join(timeout=10)
+        with self._lock:
+            self._journal.close()
+            if not self._pending and not self._failed:
+                self.journal_path.unlink(missing_ok=True)
+                self.lock_path.unlink(missing_ok=True)
+            self._owner_lock.close()
+
+
+_queue: Optional[AttendanceQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_attendance_queue(backend) -> AttendanceQueue:
+    """Process-wide write-behind queue in front of `backend`"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = AttendanceQueue(backend)
+            atexit.register(_queue.close)
+        return _queue
+
+
+def flush_attendance_queue(backend):
+    """Flush pending check-ins before a read.
+
+    Starts the queue if this process has none yet, so journals left by a crashed
+    process reach `backend` before anything reads it.
+    """
+    get_attendance_queue(backend).flush()
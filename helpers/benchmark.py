@@ -0,0 +1,341 @@
+"""Offline CPU benchmark of the recognition pipeline.
+
+    python -m helpers.benchmark --mock-weights --output bench.json [--baseline previous.json]
+
+Frames (recorded ones from --frames, or generated noise) are replayed through
+decode, detect, embed, match and log; matching is repeated over synthetic
+galleries of each --gallery-sizes and log_attendance runs through a throwaway
+write-behind queue over synthetic histories in CSV and SQLite stores, with
+queue flushes timed separately. Every stage reports p50/p95/p99
+latency and throughput, written as JSON so runs can be compared across commits.
+"""
+import argparse
+import csv
+import json
+import logging
+import platform
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import (ATTENDANCE_COLUMNS, ATTENDANCE_FLUSH_BATCH, EMBEDDING_DIM, FACE_MATCH_THRESHOLD,
+                    STORAGE_BACKEND, STUDENT_COLUMNS)
+from helpers.ann_index import _index_class, measure_recall, recall_queries
+from helpers.attendance_log import AttendanceLog
+from helpers.attendance_queue import AttendanceQueue
+from helpers.db_utils import log_attendance
+from helpers.gallery import EmbeddingGallery, _normalize
+from helpers.sqlite_backend import SqliteBackend
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+class Timings:
+    """Latency samples per stage"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def time(self, stage: str, fn: Callable, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.add(stage, time.perf_counter() - started)
+        return result
+
+    def summary(self) -> Dict[str, dict]:
+        report = {}
+        for stage, samples in self.samples.items():
+            ms = np.asarray(samples) * 1000
+            report[stage] = {
+                "count": len(ms),
+                "p50_ms": round(float(np.percentile(ms, 50)), 4),
+                "p95_ms": round(float(np.percentile(ms, 95)), 4),
+                "p99_ms": round(float(np.percentile(ms, 99)), 4),
+                "mean_ms": round(float(ms.mean()), 4),
+                "throughput_per_s": round(1000 * len(ms) / float(ms.sum()), 2) if ms.sum() else None
+            }
+        return report
+
+
+def synthetic_gallery(size: int, rng: np.random.Generator, samples_per_student: int = 0,
+                      use_index: bool = True) -> EmbeddingGallery:
+    """Random unit-vector gallery; the ANN index is trained in memory and never saved"""
+    matrix = _normalize(rng.standard_normal((size, EMBEDDING_DIM), dtype=np.float32))
+    df = pd.DataFrame({
+        "Name": [f"Student {i}" for i in range(size)],
+        "Matric No": [f"U00/BEN/SYN/{i:06d}" for i in range(size)],
+        "Department": [f"Dept {i % 20}" for i in range(size)],
+        "Image Path": [""] * size
+    })[STUDENT_COLUMNS]
+    gallery = EmbeddingGallery.from_store(df, matrix, use_index=False)
+    if use_index:
+        gallery.index = _index_class().train(matrix)
+    if samples_per_student:
+        owners = np.repeat(df["Matric No"].values, samples_per_student).tolist()
+        noise = rng.normal(scale=0.05, size=(len(owners), EMBEDDING_DIM)).astype(np.float32)
+        gallery.set_samples(owners, np.repeat(matrix, samples_per_student, axis=0) + noise)
+    return gallery
+
+
+def synthetic_queries(gallery: EmbeddingGallery, count: int,
+                      rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """Perturbed enrolled faces, lookalikes just past the match threshold and strangers, a third each"""
+    third = count // 3
+    rows = rng.integers(0, len(gallery), third)
+    known = gallery.matrix[rows] + rng.normal(scale=0.03, size=(third, EMBEDDING_DIM))
+    lookalikes = recall_queries(gallery.matrix, third, rng, FACE_MATCH_THRESHOLD + 0.2,
+                                low=FACE_MATCH_THRESHOLD)
+    strangers = rng.standard_normal((count - 2 * third, EMBEDDING_DIM))
+    return {"known": _normalize(known), "lookalike": lookalikes, "stranger": _normalize(strangers)}
+
+
+def bench_match(sizes: List[int], queries: int, samples_per_student: int, seed: int) -> Dict[str, dict]:
+    """best_match latency per gallery size and query kind, exact and through the ANN index"""
+    results = {}
+    for size in sizes:
+        rng = np.random.default_rng(seed)
+        started = time.perf_counter()
+        gallery = synthetic_gallery(size, rng, samples_per_student)
+        build_seconds = time.perf_counter() - started
+        timings = Timings()
+        for kind, kind_queries in synthetic_queries(gallery, queries, rng).items():
+            for query in kind_queries:
+                timings.time(f"exact_{kind}", gallery.best_match, query, exact=True)
+                timings.time(f"ann_{kind}", gallery.best_match, query)
+        results[str(size)] = {"build_s": round(build_seconds, 3),
+                              "ann_recall": round(measure_recall(gallery, seed=seed), 3),
+                              **timings.summary()}
+        logger.info(f"Matched {queries} queries against {size} students")
+    return results
+
+
+def write_history(path: Path, students: int, days: int) -> int:
+    """Attendance CSV with one check-in per student for each of the previous days"""
+    today = date.today()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(ATTENDANCE_COLUMNS)
+        for offset in range(days, 0, -1):
+            day = (today - timedelta(days=offset)).isoformat()
+            writer.writerows(
+                [f"Student {i}", f"U00/BEN/SYN/{i:06d}", day, "09:00:00", "Check-In"]
+                for i in range(students)
+            )
+    return students * days
+
+
+def _new_records(count: int) -> List[dict]:
+    now = datetime.now()
+    return [
+        {"Name": f"Student {i}", "Matric No": f"U00/BEN/SYN/{i:06d}", "Date": now.strftime("%Y-%m-%d"),
+         "Time": now.strftime("%H:%M:%S"), "Status": "Check-In"}
+        for i in range(count)
+    ]
+
+
+@contextmanager
+def throwaway_storage(workdir: Path, backend_name: str, history: Optional[Path] = None):
+    """Point log_attendance at a temporary backend and write-behind queue, restoring the real ones after.
+
+    The queue is only flushed by the caller, so the check-in path and the
+    backend flush can be timed apart.
+    """
+    from helpers import attendance_log, attendance_queue, db_utils
+
+    workdir.mkdir(parents=True, exist_ok=True)
+    saved = db_utils._backend, attendance_queue._queue, attendance_log._attendance_log
+    log = None
+    if backend_name == "csv":
+        from helpers.csv_backend import CsvBackend
+
+        log = AttendanceLog(path=workdir / "attendance.csv")
+        if history is not None:
+            log.path.write_bytes(history.read_bytes())
+        attendance_log._attendance_log = log
+        backend = CsvBackend()
+    else:
+        backend = SqliteBackend(path=workdir / "attendance.db")
+        if history is not None:
+            with backend.connection() as conn:
+                conn.executemany(
+                    "INSERT INTO attendance (name, matric_no, date, time, status) VALUES (?, ?, ?, ?, ?)",
+                    pd.read_csv(history, dtype=str).itertuples(index=False, name=None)
+                )
+    queue = AttendanceQueue(backend, workdir / f"{backend_name}.journal",
+                            flush_batch=2 ** 31, flush_interval=3600)
+    db_utils._backend, attendance_queue._queue = backend, queue
+    try:
+        yield queue
+    finally:
+        queue.close()
+        if log is not None:
+            log.close()
+        db_utils._backend, attendance_queue._queue, attendance_log._attendance_log = saved
+
+
+def bench_log(workdir: Path, students: int, days: int, events: int) -> Dict[str, dict]:
+    """log_attendance latency on top of a synthetic history, per storage backend"""
+    history = workdir / "history.csv"
+    rows = write_history(history, students, days)
+    records = _new_records(events)
+    results = {}
+
+    for name in ("csv", "sqlite"):
+        timings = Timings()
+        with throwaway_storage(workdir, name, history) as queue:
+            for i, record in enumerate(records):
+                timings.time("first_log" if i == 0 else "log", log_attendance,
+                             record["Name"], record["Matric No"])
+                if (i + 1) % ATTENDANCE_FLUSH_BATCH == 0 or i + 1 == len(records):
+                    # The queue's writer thread does this off the request path
+                    timings.time("flush", queue.flush)
+            for record in records[:events // 4]:
+                timings.time("duplicate", log_attendance, record["Name"], record["Matric No"])
+        results[name] = timings.summary()
+        results[name]["history_rows"] = rows
+        results[name]["flush_batch"] = ATTENDANCE_FLUSH_BATCH
+
+    logger.info(f"Logged {events} events over {rows} history rows")
+    return results
+
+
+def load_frames(frames_dir: Optional[Path], count: int, seed: int) -> List[np.ndarray]:
+    """Recorded BGR frames, or generated 640x480 noise frames"""
+    import cv2
+
+    if frames_dir is not None:
+        paths = sorted(p for p in frames_dir.iterdir() if p.suffix.lower() in _IMAGE_SUFFIXES)
+        frames = [cv2.imread(str(p)) for p in paths[:count]]
+        return [f for f in frames if f is not None]
+    rng = np.random.default_rng(seed)
+    frames = rng.integers(0, 256, (count, 480, 640, 3), dtype=np.uint8)
+    return [cv2.GaussianBlur(frame, (9, 9), 0) for frame in frames]
+
+
+def bench_pipeline(frames: List[np.ndarray], gallery: EmbeddingGallery, workdir: Path,
+                   mock_weights: bool) -> Dict[str, dict]:
+    """Replay frames through decode, detect, embed, match and log"""
+    import torch
+    from facenet_pytorch import extract_face, fixed_image_standardization
+
+    from helpers.embedding_cache import get_embedding_cache
+    from helpers.face_utils import FaceProcessor, to_rgb_array
+
+    processor = FaceProcessor(pretrained=None, mode="local") if mock_weights else FaceProcessor()
+    processor.warm_up()
+    records = iter(_new_records(len(frames)))
+    timings = Timings()
+    synthetic_crops = 0
+
+    with throwaway_storage(workdir / "pipeline", STORAGE_BACKEND) as queue:
+        for frame in frames:
+            started = time.perf_counter()
+            rgb = timings.time("decode", to_rgb_array, frame)
+            check = timings.time("detect", processor.check_frame, rgb)
+            if check.passed:
+                face = fixed_image_standardization(
+                    extract_face(rgb, check.box, processor.mtcnn.image_size, processor.mtcnn.margin))
+            else:
+                # Generated frames hold no faces, so embed a random crop to keep the stage measured
+                face = torch.randn(3, processor.mtcnn.image_size, processor.mtcnn.image_size)
+                synthetic_crops += 1
+            embedding = timings.time("embed", processor.embed_faces, face.unsqueeze(0))[0]
+            timings.time("match", gallery.best_match, embedding)
+            record = next(records)
+            timings.time("log", log_attendance, record["Name"], record["Matric No"])
+            timings.add("pipeline", time.perf_counter() - started)
+        timings.time("log_flush", queue.flush)
+
+    batch = torch.randn(16, 3, processor.mtcnn.image_size, processor.mtcnn.image_size)
+    for _ in range(5):
+        timings.time("embed_batch16", processor.embed_faces, batch, use_cache=False)
+
+    report = timings.summary()
+    report["synthetic_crops"] = synthetic_crops
+    report["model_version"] = processor.model_version
+    cache = get_embedding_cache()
+    if cache is not None:
+        report["embedding_cache"] = cache.stats()
+    return report
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(report: dict, baseline: dict, path=()):
+    """Print p95 changes against a previous report"""
+    for key, value in report.items():
+        if not isinstance(value, dict):
+            continue
+        if "p95_ms" in value and isinstance(baseline.get(key), dict) and "p95_ms" in baseline[key]:
+            before, after = baseline[key]["p95_ms"], value["p95_ms"]
+            change = f"{100 * (after - before) / before:+.1f}%" if before else "n/a"
+            print(f"{'/'.join(path + (key,)):40s} p95 {before:9.3f} -> {after:9.3f} ms  {change}")
+        elif isinstance(baseline.get(key), dict):
+            compare(value, baseline[key], path + (key,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detect, embed, match and log stages")
+    parser.add_argument("--output", type=Path, default=Path("benchmark.json"))
+    parser.add_argument("--baseline", type=Path, help="Earlier report to compare against")
+    parser.add_argument("--mock-weights", action="store_true",
+                        help="Use random ResNet weights instead of downloading vggface2")
+    parser.add_argument("--skip-models", action="store_true", help="Only benchmark matching and logging")
+    parser.add_argument("--frames", type=Path, help="Directory of recorded frames to replay")
+    parser.add_argument("--frame-count", type=int, default=50)
+    parser.add_argument("--gallery-sizes", default="100,1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--samples-per-student", type=int, default=0)
+    parser.add_argument("--history-students", type=int, default=1000)
+    parser.add_argument("--history-days", type=int, default=60)
+    parser.add_argument("--log-events", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.gallery_sizes.split(",") if s]
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "processor": platform.processor(),
+                    "platform": platform.platform()},
+        "settings": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()
+                     if k not in ("output", "baseline")}
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        report["match"] = bench_match(sizes, args.queries, args.samples_per_student, args.seed)
+        report["log"] = bench_log(workdir, args.history_students, args.history_days, args.log_events)
+        if not args.skip_models:
+            frames = load_frames(args.frames, args.frame_count, args.seed)
+            gallery = synthetic_gallery(max(sizes), np.random.default_rng(args.seed))
+            report["pipeline"] = bench_pipeline(frames, gallery, workdir, args.mock_weights)
+
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Wrote {args.output}")
+    if args.baseline:
+        compare(report, json.loads(args.baseline.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Offline bulk enrolment from a CSV manifest and a directory of ID photos.
+
+    python -m helpers.bulk_enroll manifest.csv photos/ [--workers 4] [--batch-size 16]
+
+The manifest needs Name, Matric No, Department and Image columns, where Image
+is a file name inside the photo directory. Embeddings are checkpointed next to
+the manifest so an interrupted run resumes where it stopped; the students are
+written to the store in one transaction at the end.
+"""
+import argparse
+import csv
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from helpers.db_utils import load_students, register_students
+from helpers.embedding_store import SampleStore
+from helpers.validation import validate_student_input
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_COLUMNS = ["Name", "Matric No", "Department", "Image"]
+
+# Each worker process holds its own FaceProcessor
+_processor = None
+
+
+def _init_worker(threads: int):
+    global _processor
+    import torch
+    from helpers.face_utils import FaceProcessor
+
+    torch.set_num_threads(threads)
+    _processor = FaceProcessor()
+
+
+def _embed_chunk(items: List[Tuple[str, str]]) -> List[Tuple[str, Optional[np.ndarray], str]]:
+    """Embed one chunk of (matric, image path) in a single batched pass"""
+    from helpers.face_utils import RgbFrame, to_rgb_array
+
+    readable, frames, results = [], [], []
+    for matric, path in items:
+        if not os.path.exists(path):
+            results.append((matric, None, "Image file not found"))
+            continue
+        # Decoded one by one, so a corrupt photo fails only its own row
+        try:
+            frames.append(to_rgb_array(path).view(RgbFrame))
+            readable.append(matric)
+        except Exception as e:
+            logger.error(f"Unreadable image {path}: {str(e)}")
+            results.append((matric, None, f"Unreadable image: {str(e)}"))
+
+    detections = _processor.get_face_embeddings(frames) if frames else []
+    for matric, faces in zip(readable, detections):
+        if not faces:
+            results.append((matric, None, "No face detected"))
+        else:
+            # ID photos hold one subject; faces come largest first
+            results.append((matric, faces[0].embedding, ""))
+    return results
+
+
+class FailureLog:
+    """CSV of rows that could not be enrolled"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+
+    def write(self, matric: str, image: str, reason: str):
+        new_file = not self.path.exists()
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["Matric No", "Image", "Reason"])
+            writer.writerow([matric, image, reason])
+        self.count += 1
+
+
+def _validate(manifest: pd.DataFrame, image_dir: Path, failures: FailureLog) -> pd.DataFrame:
+    """Drop rows failing validation or repeating a matric number"""
+    valid = []
+    seen = set()
+    for row in manifest.to_dict("records"):
+        ok, message = validate_student_input(row["Name"], row["Matric No"], row["Department"])
+        if ok and row["Matric No"] in seen:
+            ok, message = False, "Duplicate matric number in manifest"
+        if not ok:
+            failures.write(row["Matric No"], row["Image"], message)
+            continue
+        seen.add(row["Matric No"])
+        row["Image Path"] = str(image_dir / row["Image"])
+        valid.append(row)
+    return pd.DataFrame(valid, columns=MANIFEST_COLUMNS + ["Image Path"])
+
+
+def run(manifest_path: Path, image_dir: Path, workers: int, batch_size: int) -> Tuple[bool, str]:
+    manifest = pd.read_csv(manifest_path, dtype=str).fillna("")
+    missing = [c for c in MANIFEST_COLUMNS if c not in manifest.columns]
+    if missing:
+        return False, f"Manifest is missing columns: {', '.join(missing)}"
+
+    # Failed rows are retried on every run, so the log only covers the latest one
+    failures = FailureLog(manifest_path.with_name(f"{manifest_path.stem}_failures.csv"))
+    failures.path.unlink(missing_ok=True)
+    checkpoint = SampleStore(
+        manifest_path.with_name(f"{manifest_path.stem}.progress.emb"),
+        manifest_path.with_name(f"{manifest_path.stem}.progress.csv")
+    )
+
+    rows = _validate(manifest, image_dir, failures)
+    done, _ = checkpoint.load()
+    skip = set(done) | set(load_students()["Matric No"].values)
+    pending = rows[~rows["Matric No"].isin(skip)]
+    logger.info(f"{len(rows)} valid rows, {len(rows) - len(pending)} already done, {len(pending)} to embed")
+
+    items = list(zip(pending["Matric No"], pending["Image Path"]))
+    images = dict(zip(pending["Matric No"], pending["Image"]))
+    chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    started = time.monotonic()
+    completed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = [pool.submit(_embed_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            for matric, embedding, error in future.result():
+                if embedding is None:
+                    failures.write(matric, images[matric], error)
+                else:
+                    checkpoint.append(matric, embedding)
+            completed += 1
+            elapsed = time.monotonic() - started
+            done_items = min(completed * batch_size, len(items))
+            rate = done_items / elapsed if elapsed else 0.0
+            eta = (len(items) - done_items) / rate if rate else 0.0
+            print(f"[{done_items}/{len(items)}] {rate:.1f} images/s, ETA {eta:.0f}s, "
+                  f"{failures.count} failures", flush=True)
+
+    owners, embeddings = checkpoint.load()
+    by_matric = rows.set_index("Matric No")
+    keep = [i for i, m in enumerate(owners) if m in by_matric.index]
+    records = [
+        {"Name": by_matric.at[owners[i], "Name"], "Matric No": owners[i],
+         "Department": by_matric.at[owners[i], "Department"],
+         "Image Path": by_matric.at[owners[i], "Image Path"]}
+        for i in keep
+    ]
+    success, message = register_students(records, np.asarray(embeddings)[keep])
+    if success:
+        checkpoint.vectors.clear()
+        checkpoint.owners_path.unlink(missing_ok=True)
+        if failures.count:
+            message += f"; {failures.count} rows failed, see {failures.path}"
+    return success, message
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk enrol students from ID photos")
+    parser.add_argument("manifest", type=Path, help="CSV with Name, Matric No, Department, Image")
+    parser.add_argument("image_dir", type=Path, help="Directory holding the photos")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--batch-size", type=int, default=16, help="Photos per forward pass")
+    args = parser.parse_args()
+
+    success, message = run(args.manifest, args.image_dir, args.workers, args.batch_size)
+    print(message)
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
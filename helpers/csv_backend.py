@@ -0,0 +1,151 @@
+import io
+import logging
+from typing import List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import ATTENDANCE_COLUMNS, ATTENDANCE_CSV, STUDENT_COLUMNS, STUDENT_CSV
+from helpers.attendance_log import get_attendance_log
+from helpers.embedding_store import EmbeddingStore, SampleStore, migrate_embedding_column
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CsvBackend:
+    """Students in a CSV plus binary embedding store, attendance in an append-only CSV"""
+
+    def __init__(self):
+        # Row i of the embedding store belongs to row i of STUDENT_CSV
+        self.embedding_store = EmbeddingStore()
+        self.sample_store = SampleStore()
+
+    def load_students(self) -> pd.DataFrame:
+        if not STUDENT_CSV.exists():
+            return pd.DataFrame(columns=STUDENT_COLUMNS)
+        df = pd.read_csv(STUDENT_CSV)
+        if "Embedding" in df.columns:
+            migrate_embedding_column(self.embedding_store)
+            df = df.drop(columns=["Embedding"])
+        return df
+
+    def load_embeddings(self) -> np.ndarray:
+        return self.embedding_store.load()
+
+    def load_samples(self) -> Tuple[List[str], np.ndarray]:
+        return self.sample_store.load()
+
+    def read_students_since(self, row: int) -> Tuple[pd.DataFrame, np.ndarray, int]:
+        """Students stored after row `row` with their embeddings, and the row to resume from"""
+        stored = len(self.embedding_store)
+        if row > stored:
+            raise ValueError("Embedding store is shorter than the given row")
+        if row == stored and row > 0:
+            return pd.DataFrame(columns=STUDENT_COLUMNS), self.embedding_store.load()[:0], row
+
+        if row == 0:
+            # Also migrates a legacy Embedding column into the store
+            df = self.load_students()
+        else:
+            data = STUDENT_CSV.read_bytes()
+            # A partially rewritten file is picked up on the next call
+            data = data[:data.rfind(b"\n") + 1]
+            df = pd.read_csv(io.BytesIO(data), skiprows=range(1, row + 1))
+        embeddings = self.embedding_store.load()
+        # An embedding is appended before its CSV row, so only rows present in both count
+        rows = max(min(len(df), len(embeddings) - row), 0)
+        return df.iloc[:rows].reset_index(drop=True), embeddings[row:row + rows], row + rows
+
+    def read_samples_since(self, row: int) -> Tuple[List[str], np.ndarray, int]:
+        """Enrolment samples stored after row `row`, and the row to resume from"""
+        stored = len(self.sample_store.vectors)
+        if row > stored:
+            raise ValueError("Sample store is shorter than the given row")
+        if row == stored:
+            return [], self.sample_store.vectors.load()[:0], row
+        owners, matrix = self.sample_store.load()
+        return owners[row:], matrix[row:], max(len(owners), row)
+
+    def add_student(self, record: dict, embedding: list, samples=None) -> bool:
+        """Store a student, returning False if the matric number exists"""
+        df = self.load_students()
+        if record["Matric No"] in df["Matric No"].values:
+            return False
+
+        row = self.embedding_store.append(embedding)
+        try:
+            df = pd.concat([df, pd.DataFrame([record])], ignore_index=True)
+            df.to_csv(STUDENT_CSV, index=False)
+        except Exception:
+            self.embedding_store.truncate(row)
+            raise
+
+        # Samples only refine matching, so the student stays registered without them
+        if samples is not None and len(samples):
+            try:
+                self.sample_store.append(record["Matric No"], samples)
+            except Exception as e:
+                logger.error(f"Error storing enrolment samples: {str(e)}")
+        return True
+
+    def add_students(self, records: List[dict], embeddings: np.ndarray) -> List[dict]:
+        """Store many students in one write, returning the records actually added"""
+        df = self.load_students()
+        existing = set(df["Matric No"].values)
+        keep = []
+        for i, record in enumerate(records):
+            if record["Matric No"] not in existing:
+                existing.add(record["Matric No"])
+                keep.append(i)
+        if not keep:
+            return []
+
+        added = [records[i] for i in keep]
+        row = self.embedding_store.append(np.asarray(embeddings)[keep])
+        try:
+            df = pd.concat([df, pd.DataFrame(added)[STUDENT_COLUMNS]], ignore_index=True)
+            df.to_csv(STUDENT_CSV, index=False)
+        except Exception:
+            self.embedding_store.truncate(row)
+            raise
+        return added
+
+    def add_attendance(self, record: dict) -> bool:
+        """Append a record, returning False if it was already marked"""
+        # Duplicate check and append are a single step on the log
+        return get_attendance_log().append(record)
+
+    def add_attendance_many(self, records: List[dict]) -> int:
+        """Append a batch of records in one write, skipping any already marked"""
+        return len(get_attendance_log().append_many(records))
+
+    def today_keys(self, today: str) -> Set[Tuple[str, str, str]]:
+        """(matric, date, status) keys already marked on `today`"""
+        return get_attendance_log().today_keys(today)
+
+    def load_attendance(self) -> pd.DataFrame:
+        if ATTENDANCE_CSV.exists():
+            return pd.read_csv(ATTENDANCE_CSV)
+        return pd.DataFrame(columns=ATTENDANCE_COLUMNS)
+
+    def read_attendance_since(self, offset: int) -> Tuple[pd.DataFrame, int]:
+        """Records appended after byte `offset`, and the offset to resume from"""
+        if not ATTENDANCE_CSV.exists():
+            return pd.DataFrame(columns=ATTENDANCE_COLUMNS), 0
+        if offset > ATTENDANCE_CSV.stat().st_size:
+            raise ValueError("Attendance file is shorter than the given offset")
+
+        with open(ATTENDANCE_CSV, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # A partially written last line is picked up on the next call
+        data = data[:data.rfind(b"\n") + 1]
+        if not data.strip():
+            return pd.DataFrame(columns=ATTENDANCE_COLUMNS), offset + len(data)
+        if offset == 0:
+            df = pd.read_csv(io.BytesIO(data), dtype=str)
+        else:
+            df = pd.read_csv(io.BytesIO(data), header=None, names=ATTENDANCE_COLUMNS, dtype=str)
+        return df, offset + len(data)
@@ -1,72 +1,119 @@
 import pandas as pd
-import json
+import numpy as np
 from datetime import datetime
 import logging
-from typing import Tuple, Optional
-from config import STUDENT_CSV, ATTENDANCE_CSV
+import threading
+from typing import Callable, List, Optional, Tuple
+from config import ATTENDANCE_COLUMNS, ATTENDANCE_WRITE_BEHIND, STORAGE_BACKEND, STUDENT_COLUMNS
+from helpers.attendance_queue import flush_attendance_queue, get_attendance_queue
+from helpers.metrics import increment, timed
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Callbacks notified with (record, embedding, samples) after a successful registration
+_registration_listeners: List[Callable[[dict, list, Optional[list]], None]] = []
+
+def add_registration_listener(callback: Callable[[dict, list, Optional[list]], None]):
+    """Subscribe to newly registered students"""
+    if callback not in _registration_listeners:
+        _registration_listeners.append(callback)
+
+def _notify_registration(record: dict, embedding: list, samples: Optional[list]):
+    for callback in _registration_listeners:
+        try:
+            callback(record, embedding, samples)
+        except Exception as e:
+            logger.error(f"Registration listener failed: {str(e)}")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """Storage backend selected by STORAGE_BACKEND"""
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            return _backend
+        if STORAGE_BACKEND == "sqlite":
+            from helpers.sqlite_backend import SqliteBackend
+            _backend = SqliteBackend()
+        elif STORAGE_BACKEND == "csv":
+            from helpers.csv_backend import CsvBackend
+            _backend = CsvBackend()
+        else:
+            raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+        return _backend
+
 def load_students() -> pd.DataFrame:
     """Load student records"""
     try:
-        if STUDENT_CSV.exists():
-            return pd.read_csv(STUDENT_CSV)
-        return pd.DataFrame(columns=["Name", "Matric No", "Department", "Image Path", "Embedding"])
+        return get_backend().load_students()
     except Exception as e:
         logger.error(f"Error loading students: {str(e)}")
-        return pd.DataFrame(columns=["Name", "Matric No", "Department", "Image Path", "Embedding"])
+        return pd.DataFrame(columns=STUDENT_COLUMNS)
+
+def load_embeddings() -> np.ndarray:
+    """Load the embedding rows matching load_students()"""
+    return get_backend().load_embeddings()
+
+def load_samples() -> Tuple[List[str], np.ndarray]:
+    """Load per-sample enrolment embeddings and their owning matric numbers"""
+    return get_backend().load_samples()
+
+def read_students_since(cursor: int) -> Tuple[pd.DataFrame, np.ndarray, int]:
+    """Students added after `cursor` with their embeddings, and the cursor to pass next time"""
+    return get_backend().read_students_since(cursor)
+
+def read_samples_since(cursor: int) -> Tuple[List[str], np.ndarray, int]:
+    """Enrolment samples added after `cursor`, and the cursor to pass next time"""
+    return get_backend().read_samples_since(cursor)
 
 def register_student(name: str, matric_no: str, department: str, 
-                    image_path: str, embedding_list: list) -> Tuple[bool, str]:
-    """Register a new student"""
+                    image_path: str, embedding_list: list,
+                    sample_embeddings: Optional[list] = None) -> Tuple[bool, str]:
+    """Register a new student with a centroid embedding and optional per-sample vectors"""
     try:
-        df = load_students()
-        
-        # Check for duplicate matric number
-        if matric_no in df["Matric No"].values:
-            return False, "Matric number already exists"
-
         new_entry = {
             "Name": name,
             "Matric No": matric_no,
             "Department": department,
-            "Image Path": str(image_path),
-            "Embedding": json.dumps(embedding_list)
+            "Image Path": str(image_path)
         }
         
-        df = pd.concat([df, pd.DataFrame([new_entry])], ignore_index=True)
-        df.to_csv(STUDENT_CSV, index=False)
+        # Check for duplicate matric number
+        if not get_backend().add_student(new_entry, embedding_list, sample_embeddings):
+            return False, "Matric number already exists"
+
+        _notify_registration(new_entry, embedding_list, sample_embeddings)
         return True, "Student registered successfully"
 
     except Exception as e:
         logger.error(f"Error in student registration: {str(e)}")
         return False, f"Registration failed: {str(e)}"
 
+def register_students(records: List[dict], embeddings: np.ndarray) -> Tuple[bool, str]:
+    """Register many students in a single store write; existing matric numbers are skipped"""
+    try:
+        records = [{c: str(r[c]) for c in STUDENT_COLUMNS} for r in records]
+        added = get_backend().add_students(records, embeddings)
+        by_matric = {r["Matric No"]: i for i, r in enumerate(records)}
+        for record in added:
+            _notify_registration(record, list(embeddings[by_matric[record["Matric No"]]]), None)
+        skipped = len(records) - len(added)
+        return True, f"Registered {len(added)} students ({skipped} already existed)"
+
+    except Exception as e:
+        logger.error(f"Error in bulk registration: {str(e)}")
+        return False, f"Bulk registration failed: {str(e)}"
+
 def log_attendance(name: str, matric_no: str, status: str = "Check-In") -> Tuple[bool, str]:
     """Log student attendance"""
     try:
         now = datetime.now()
         today = now.strftime("%Y-%m-%d")
         
-        # Load or create attendance DataFrame
-        if ATTENDANCE_CSV.exists():
-            df = pd.read_csv(ATTENDANCE_CSV)
-        else:
-            df = pd.DataFrame(columns=["Name", "Matric No", "Date", "Time", "Status"])
-
-        # Check for duplicate attendance
-        existing = df[
-            (df["Matric No"] == matric_no) & 
-            (df["Date"] == today) &
-            (df["Status"] == status)
-        ]
-        
-        if not existing.empty:
-            return False, "Attendance already marked for today"
-
         record = {
             "Name": name,
             "Matric No": matric_no,
@@ -75,8 +122,15 @@ def log_attendance(name: str, matric_no: str, status: str = "Check-In") -> Tuple
             "Status": status
         }
         
-        df = pd.concat([df, pd.DataFrame([record])], ignore_index=True)
-        df.to_csv(ATTENDANCE_CSV, index=False)
+        with timed("storage_write"):
+            if ATTENDANCE_WRITE_BEHIND:
+                # Duplicates are caught in memory; the backend write happens in the background
+                added = get_attendance_queue(get_backend()).enqueue(record)
+            else:
+                added = get_backend().add_attendance(record)
+        if not added:
+            increment("duplicate")
+            return False, "Attendance already marked for today"
         return True, "Attendance marked successfully"
 
     except Exception as e:
@@ -86,9 +140,15 @@ def log_attendance(name: str, matric_no: str, status: str = "Check-In") -> Tuple
 def load_attendance() -> pd.DataFrame:
     """Load attendance records"""
     try:
-        if ATTENDANCE_CSV.exists():
-            return pd.read_csv(ATTENDANCE_CSV)
-        return pd.DataFrame(columns=["Name", "Matric No", "Date", "Time", "Status"])
+        if ATTENDANCE_WRITE_BEHIND:
+            flush_attendance_queue(get_backend())
+        return get_backend().load_attendance()
     except Exception as e:
         logger.error(f"Error loading attendance: {str(e)}")
-        return pd.DataFrame(columns=["Name", "Matric No", "Date", "Time", "Status"])
\ No newline at end of file
+        return pd.DataFrame(columns=ATTENDANCE_COLUMNS)
+
+def read_attendance_since(cursor: int) -> Tuple[pd.DataFrame, int]:
+    """Attendance records added after `cursor`, and the cursor to pass next time"""
+    if ATTENDANCE_WRITE_BEHIND:
+        flush_attendance_queue(get_backend())
+    return get_backend().read_attendance_since(cursor)
@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_DISK, EMBEDDING_CACHE_SIZE, EMBEDDING_DIM
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def crop_key(crop: np.ndarray, model_version: str) -> str:
+    """Content hash of a preprocessed face crop under one model version"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(model_version.encode("utf-8"))
+    digest.update(str(crop.shape).encode("ascii"))
+    digest.update(np.ascontiguousarray(crop, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """LRU map from face crop hashes to embeddings, with an optional on-disk tier"""
+
+    def __init__(self, capacity: int = EMBEDDING_CACHE_SIZE, disk_dir=None):
+        self.capacity = capacity
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key: str):
+        return self.disk_dir / key[:2] / f"{key}.npy"
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+        if self.disk_dir is not None:
+            try:
+                embedding = np.load(self._disk_path(key))
+            except (OSError, ValueError):
+                embedding = None
+            if embedding is not None and embedding.shape == (EMBEDDING_DIM,):
+                with self._lock:
+                    self._remember(key, embedding)
+                    self.disk_hits += 1
+                return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, embedding: np.ndarray):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, embedding)
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp, "wb") as f:
+                    np.save(f, embedding)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.error(f"Error writing embedding cache entry: {str(e)}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide embedding cache, or None when EMBEDDING_CACHE_SIZE is 0"""
+    global _cache
+    with _cache_lock:
+        if _cache is None and EMBEDDING_CACHE_SIZE > 0:
+            _cache = EmbeddingCache(disk_dir=EMBEDDING_CACHE_DIR if EMBEDDING_CACHE_DISK else None)
+        return _cache
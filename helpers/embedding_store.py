@@ -0,0 +1,131 @@
+import csv
+import json
+import logging
+import os
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import EMBEDDING_DIM, EMBEDDING_STORE, SAMPLE_OWNERS_CSV, SAMPLE_STORE, STUDENT_CSV
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DTYPE = np.float32
+
+
+class EmbeddingStore:
+    """Append-only binary file of normalised embeddings, one row per student"""
+
+    def __init__(self, path=EMBEDDING_STORE, dim: int = EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        self.row_bytes = dim * np.dtype(EMBEDDING_DTYPE).itemsize
+
+    def __len__(self) -> int:
+        if not self.path.exists():
+            return 0
+        return self.path.stat().st_size // self.row_bytes
+
+    def load(self) -> np.ndarray:
+        """Memory-map all stored rows read-only"""
+        rows = len(self)
+        if rows == 0:
+            return np.empty((0, self.dim), dtype=EMBEDDING_DTYPE)
+        return np.memmap(self.path, dtype=EMBEDDING_DTYPE, mode="r", shape=(rows, self.dim))
+
+    def append(self, vectors) -> int:
+        """Append embeddings and return the row index of the first one"""
+        vectors = np.asarray(vectors, dtype=EMBEDDING_DTYPE).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        first_row = len(self)
+        with open(self.path, "ab") as f:
+            f.write((vectors / norms).astype(EMBEDDING_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        return first_row
+
+    def truncate(self, rows: int):
+        """Drop every row from index `rows` onwards"""
+        with open(self.path, "r+b") as f:
+            f.truncate(rows * self.row_bytes)
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+class SampleStore:
+    """Per-sample enrolment embeddings with a parallel file of owning matric numbers"""
+
+    def __init__(self, path=SAMPLE_STORE, owners_path=SAMPLE_OWNERS_CSV):
+        self.vectors = EmbeddingStore(path)
+        self.owners_path = owners_path
+
+    def append(self, matric_no: str, samples):
+        """Append every sample vector of one student"""
+        samples = np.asarray(samples, dtype=EMBEDDING_DTYPE).reshape(-1, self.vectors.dim)
+        row = self.vectors.append(samples)
+        try:
+            with open(self.owners_path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows([[matric_no]] * len(samples))
+        except Exception:
+            self.vectors.truncate(row)
+            raise
+
+    def load(self) -> Tuple[List[str], np.ndarray]:
+        """Return owner matric numbers and the memory-mapped sample rows"""
+        if not self.owners_path.exists():
+            return [], self.vectors.load()[:0]
+        with open(self.owners_path, newline="", encoding="utf-8") as f:
+            owners = [row[0] for row in csv.reader(f) if row]
+        matrix = self.vectors.load()
+        # Rows past a torn write on either file are ignored
+        rows = min(len(owners), len(matrix))
+        return owners[:rows], matrix[:rows]
+
+
+def check_consistency(store: EmbeddingStore = None) -> Tuple[bool, str]:
+    """Verify that student metadata rows and embedding rows line up"""
+    store = store or EmbeddingStore()
+    if store.path.exists() and store.path.stat().st_size % store.row_bytes:
+        return False, "Embedding store has a partial trailing row"
+    students = pd.read_csv(STUDENT_CSV) if STUDENT_CSV.exists() else pd.DataFrame()
+    if "Embedding" in students.columns:
+        return False, "Student file still has a legacy Embedding column"
+    if len(students) != len(store):
+        return False, f"{len(students)} student rows but {len(store)} embedding rows"
+    return True, ""
+
+
+def migrate_embedding_column(store: EmbeddingStore = None) -> Tuple[bool, str]:
+    """Move the legacy JSON Embedding column into the binary store"""
+    store = store or EmbeddingStore()
+    try:
+        if not STUDENT_CSV.exists():
+            return True, "No student file to migrate"
+        df = pd.read_csv(STUDENT_CSV)
+        if "Embedding" not in df.columns:
+            return True, "Already migrated"
+
+        vectors = np.array([json.loads(e) for e in df["Embedding"]], dtype=EMBEDDING_DTYPE)
+        store.clear()
+        if len(vectors):
+            store.append(vectors)
+        df.drop(columns=["Embedding"]).to_csv(STUDENT_CSV, index=False)
+        logger.info(f"Migrated {len(vectors)} embeddings to {store.path}")
+        return True, f"Migrated {len(vectors)} embeddings"
+
+    except Exception as e:
+        logger.error(f"Error migrating embeddings: {str(e)}")
+        return False, f"Migration failed: {str(e)}"
+
+
+if __name__ == "__main__":
+    ok, message = migrate_embedding_column()
+    print(message)
+    ok, message = check_consistency()
+    print("Store is consistent" if ok else f"Inconsistent store: {message}")
@@ -0,0 +1,137 @@
+"""Chunked attendance exports built from the date partitions.
+
+    python -m helpers.export out.csv --start 2024-01-08 --end 2024-04-26 [--mode percentage]
+
+Records are written one day partition at a time and the percentage mode is
+folded from the per-student daily aggregates, so memory stays bounded by a
+single day whatever the range.
+"""
+import argparse
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import pandas as pd
+
+from config import EXPORT_DIR, EXPORT_MAX_AGE
+from helpers.analytics import get_analytics
+from helpers.db_utils import load_students
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/octet-stream"}
+EXPORT_MODES = ["records", "percentage"]
+PERCENTAGE_COLUMNS = ["Name", "Matric No", "Days Present", "Class Days", "Attendance %"]
+
+
+def remove_stale_exports(max_age: float = EXPORT_MAX_AGE) -> int:
+    """Delete export files older than `max_age` seconds and return how many went"""
+    if not EXPORT_DIR.exists():
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for path in EXPORT_DIR.iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError as e:
+            logger.error(f"Error removing export {path.name}: {str(e)}")
+    return removed
+
+
+def attendance_percentage(start: str, end: str, name: Optional[str] = None) -> pd.DataFrame:
+    """Share of class days each registered student attended in the range"""
+    analytics = get_analytics()
+    present = Counter()
+    names = {}
+    class_days = 0
+    # A class day is any day with at least one record
+    for day in analytics.iter_student_days(start, end):
+        class_days += 1
+        present.update(day["Matric No"].values)
+        names.update(zip(day["Matric No"].values, day["Name"].values))
+
+    # Students who never attended still appear, at zero
+    for student in load_students()[["Matric No", "Name"]].itertuples(index=False):
+        names.setdefault(student[0], student[1])
+
+    df = pd.DataFrame(
+        [(n, m, present[m]) for m, n in names.items() if name is None or n == name],
+        columns=PERCENTAGE_COLUMNS[:3]
+    )
+    df["Class Days"] = class_days
+    df["Attendance %"] = (100 * df["Days Present"] / class_days).round(1) if class_days else 0.0
+    return df.sort_values(["Attendance %", "Name"], ascending=[False, True], ignore_index=True)
+
+
+def iter_export_chunks(start: str, end: str, name: Optional[str] = None,
+                       mode: str = "records") -> Iterator[pd.DataFrame]:
+    if mode == "records":
+        yield from get_analytics().iter_records(start, end, name)
+    elif mode == "percentage":
+        yield attendance_percentage(start, end, name)
+    else:
+        raise ValueError(f"Unknown export mode: {mode}")
+
+
+def write_export(target: Path, fmt: str, start: str, end: str, name: Optional[str] = None,
+                 mode: str = "records") -> Tuple[bool, str]:
+    """Write the filtered export chunk by chunk, never holding more than one in memory"""
+    try:
+        get_analytics().sync()
+        rows = 0
+        if fmt == "csv":
+            with open(target, "w", newline="", encoding="utf-8") as f:
+                for chunk in iter_export_chunks(start, end, name, mode):
+                    chunk.to_csv(f, header=f.tell() == 0, index=False)
+                    rows += len(chunk)
+        elif fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            writer = None
+            try:
+                for chunk in iter_export_chunks(start, end, name, mode):
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(target, table.schema)
+                    # Each chunk becomes a row group
+                    writer.write_table(table.cast(writer.schema))
+                    rows += len(chunk)
+            finally:
+                if writer is not None:
+                    writer.close()
+            if writer is None:
+                pd.DataFrame().to_parquet(target)
+        else:
+            return False, f"Unknown export format: {fmt}"
+
+        return True, f"Exported {rows} rows to {target.name}"
+
+    except Exception as e:
+        logger.error(f"Error exporting attendance: {str(e)}")
+        return False, f"Export failed: {str(e)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export attendance for a date range")
+    parser.add_argument("output", type=Path, help="Target .csv or .parquet file")
+    parser.add_argument("--start", required=True, help="First date, YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="Last date, YYYY-MM-DD")
+    parser.add_argument("--student", help="Only this student name")
+    parser.add_argument("--mode", choices=EXPORT_MODES, default="records")
+    args = parser.parse_args()
+
+    fmt = args.output.suffix.lstrip(".").lower()
+    success, message = write_export(args.output, fmt, args.start, args.end, args.student, args.mode)
+    print(message)
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import itertools
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from config import (STREAM_CONFIRM_FRAMES, TRACK_DRIFT_IOU, TRACK_IOU_THRESHOLD, TRACK_MAX_LOST,
+                    TRACK_REFRESH_FRAMES)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def iou(a: np.ndarray, b: np.ndarray) -> float:
+    """Intersection over union of two (x1, y1, x2, y2) boxes"""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return float(intersection / union) if union > 0 else 0.0
+
+
+class Track:
+    """One face followed across frames, with its last embedding and identity"""
+
+    def __init__(self, track_id: int, box: np.ndarray, probability: float,
+                 confirm_frames: int = STREAM_CONFIRM_FRAMES):
+        self.id = track_id
+        self.confirm_frames = confirm_frames
+        self.box = box
+        self.probability = probability
+        self.lost = 0
+
+        self.embedding: Optional[np.ndarray] = None
+        self.embedded_box: Optional[np.ndarray] = None
+        self.frames_since_embed = 0
+        self.student: Optional[dict] = None
+        self.distance = float('inf')
+        # Consecutive embeddings that agreed on a student, or found nobody
+        self.matches = 0
+        self.misses = 0
+
+    @property
+    def settled(self) -> bool:
+        """Identity confirmed, or consistently unknown, by enough independent embeddings"""
+        return self.matches >= self.confirm_frames or self.misses >= self.confirm_frames
+
+    @property
+    def confirmed(self) -> bool:
+        return self.matches >= self.confirm_frames
+
+    def needs_embedding(self, drift_iou: float, refresh_frames: int) -> bool:
+        if self.embedding is None or not self.settled:
+            return True
+        # Settled tracks are trusted until they move or their identity goes stale
+        return iou(self.box, self.embedded_box) < drift_iou or self.frames_since_embed >= refresh_frames
+
+
+class FaceTracker:
+    """Greedy IoU association of per-frame detections to tracks"""
+
+    def __init__(self, confirm_frames: int = STREAM_CONFIRM_FRAMES,
+                 iou_threshold: float = TRACK_IOU_THRESHOLD, drift_iou: float = TRACK_DRIFT_IOU, refresh_frames: int = TRACK_REFRESH_FRAMES,
+                 max_lost: int = TRACK_MAX_LOST):
+        self.confirm_frames = confirm_frames
+        self.iou_threshold = iou_threshold
+        self.drift_iou = drift_iou
+        self.refresh_frames = refresh_frames
+        self.max_lost = max_lost
+        self.tracks: List[Track] = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes: np.ndarray, probs: np.ndarray) -> List[Track]:
+        """Advance one frame and return the tracks seen in it"""
+        pairs = sorted(
+            ((iou(track.box, box), t, d)
+             for t, track in enumerate(self.tracks) for d, box in enumerate(boxes)),
+            reverse=True
+        )
+        assigned_tracks, assigned_boxes = set(), set()
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in assigned_tracks or d in assigned_boxes:
+                continue
+            assigned_tracks.add(t)
+            assigned_boxes.add(d)
+            track = self.tracks[t]
+            track.box, track.probability, track.lost = boxes[d], float(probs[d]), 0
+            track.frames_since_embed += 1
+
+        for t, track in enumerate(self.tracks):
+            if t not in assigned_tracks:
+                track.lost += 1
+        seen = [self.tracks[t] for t in sorted(assigned_tracks)]
+        self.tracks = [track for track in self.tracks if track.lost <= self.max_lost]
+
+        for d, box in enumerate(boxes):
+            if d not in assigned_boxes:
+                track = Track(next(self._ids), box, float(probs[d]), self.confirm_frames)
+                self.tracks.append(track)
+                seen.append(track)
+        return seen
+
+    def stale(self, tracks: List[Track]) -> List[Track]:
+        """Tracks among `tracks` whose embedding has to be recomputed"""
+        return [t for t in tracks if t.needs_embedding(self.drift_iou, self.refresh_frames)]
+
+    @staticmethod
+    def record(track: Track, embedding: np.ndarray, match_found: bool, distance: float,
+               student: Optional[dict]):
+        """Store a fresh embedding and its match result on the track"""
+        track.embedding = embedding
+        track.embedded_box = track.box
+        track.frames_since_embed = 0
+        track.distance = distance
+        if not match_found:
+            track.student, track.matches = None, 0
+            track.misses += 1
+        elif track.student is not None and track.student["Matric No"] == student["Matric No"]:
+            track.matches += 1
+            track.misses = 0
+        else:
+            track.student, track.matches, track.misses = student, 1, 0
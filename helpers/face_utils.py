@@ -1,18 +1,79 @@
 import torch
-from facenet_pytorch import MTCNN, InceptionResnetV1
+from facenet_pytorch import MTCNN, InceptionResnetV1, extract_face, fixed_image_standardization
 import numpy as np
 from PIL import Image
 import cv2
 import logging
-from typing import Optional
-from config import FACE_DETECTION_CONFIDENCE
+import threading
+import time
+from collections import Counter
+from typing import List, NamedTuple, Optional, Tuple
+from config import (EMBEDDING_BATCH_SIZE, EMBEDDING_DIM, ENROLMENT_MIN_SAMPLES,
+                    ENROLMENT_OUTLIER_DISTANCE, FACE_DETECTION_CONFIDENCE, INFERENCE_BACKEND,
+                    INFERENCE_MODE, MAX_BRIGHTNESS, MIN_BRIGHTNESS, MIN_FACE_SIZE, MIN_SHARPNESS,
+                    MODEL_WARMUP, PREFILTER_ENABLED, PREFILTER_FACTOR, PREFILTER_MIN_FACE_SIZE,
+                    PREFILTER_SCALE)
+from helpers.embedding_cache import crop_key, get_embedding_cache
+from helpers.inference_backends import build_embedder
+from helpers.inference_server import MicroBatcher, RemoteEmbedder
+from helpers.metrics import increment, timed
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Reference point for time-to-ready measurements
+_IMPORTED_AT = time.perf_counter()
+
+class DetectedFace(NamedTuple):
+    box: np.ndarray
+    probability: float
+    embedding: np.ndarray
+
+class FrameCheck(NamedTuple):
+    passed: bool
+    reason: str
+    box: Optional[np.ndarray] = None  # in original frame coordinates
+    probability: float = 0.0
+
+class RgbFrame(np.ndarray):
+    """Array view marking a frame that is already RGB, so no conversion is needed"""
+
+def to_rgb_array(image) -> np.ndarray:
+    """Convert a BGR array, image path or PIL Image to an RGB array"""
+    if isinstance(image, RgbFrame):
+        return np.asarray(image)
+    if isinstance(image, np.ndarray):
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if isinstance(image, str):
+        image = Image.open(image)
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert("RGB"))
+    raise ValueError("Unsupported image type")
+
+def to_tensor_view(rgb: np.ndarray) -> torch.Tensor:
+    """HWC uint8 tensor sharing memory with `rgb`, which MTCNN takes without copying"""
+    if not rgb.flags.writeable:
+        # Arrays borrowed from PIL are read-only, and torch needs to own a writable buffer
+        rgb = rgb.copy()
+    return torch.from_numpy(rgb)
+
+# Per-thread scratch arrays reused by the quality gate
+_scratch = threading.local()
+
+def scratch_buffer(name: str, shape: Tuple[int, ...]) -> np.ndarray:
+    """Preallocated uint8 array for this thread, reallocated only when the shape changes"""
+    buffer = getattr(_scratch, name, None)
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty(shape, dtype=np.uint8)
+        setattr(_scratch, name, buffer)
+    return buffer
+
 class FaceProcessor:
-    def __init__(self):
+    def __init__(self, pretrained: Optional[str] = 'vggface2', mode: str = INFERENCE_MODE):
+        """`pretrained=None` keeps random ResNet weights, for offline benchmarks"""
+        started = time.perf_counter()
+        self.first_inference_seconds = None
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.mtcnn = MTCNN(
             image_size=160,
@@ -22,41 +83,298 @@ class FaceProcessor:
             factor=0.709,
             device=self.device
         )
-        self.resnet = InceptionResnetV1(pretrained='vggface2').eval().to(self.device)
-        logger.info(f"Face processor initialized using device: {self.device}")
+        # Coarser detector used on downscaled frames by check_frame
+        self.gate_mtcnn = MTCNN(
+            image_size=160,
+            margin=0,
+            min_face_size=PREFILTER_MIN_FACE_SIZE,
+            thresholds=[0.6, 0.7, 0.7],
+            factor=PREFILTER_FACTOR,
+            device=self.device
+        )
+        if mode == "client":
+            # The inference server holds the only ResNet
+            self.resnet = None
+            self.embedder = RemoteEmbedder()
+            self.model_version = self._remote_model_version()
+        else:
+            self.resnet = InceptionResnetV1(pretrained=pretrained).eval().to(self.device)
+            # Compiled backends cache artifacts on disk, which must never hold random weights
+            self.embedder, backend = build_embedder(
+                self.resnet, self.device, INFERENCE_BACKEND if pretrained else "eager", self.mtcnn)
+            if mode == "batched":
+                self.embedder = MicroBatcher(self.embedder)
+            # Cached embeddings are only reused for the same weights and the backend that actually runs
+            self.model_version = f"inception_resnet_v1-{pretrained or 'random'}-{backend}"
+        self.rejections = Counter()
+        logger.info(f"Face processor initialized using device: {self.device} "
+                    f"in {time.perf_counter() - started:.2f}s")
+
+    def _remote_model_version(self) -> str:
+        try:
+            return self.embedder.health()["model_version"]
+        except Exception as e:
+            logger.error(f"Inference server at {self.embedder.url} is not reachable: {str(e)}")
+            return f"remote-{self.embedder.url}"
+
+    def check_frame(self, rgb: np.ndarray) -> FrameCheck:
+        """Reject frames that are too dark, bright, blurred or lack a usable face"""
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY, dst=scratch_buffer("gray", rgb.shape[:2]))
+        brightness = gray.mean()
+        if brightness < MIN_BRIGHTNESS:
+            return FrameCheck(False, "Image is too dark")
+        if brightness > MAX_BRIGHTNESS:
+            return FrameCheck(False, "Image is too bright")
+
+        height, width = rgb.shape[:2]
+        small_size = (max(round(width * PREFILTER_SCALE), 1), max(round(height * PREFILTER_SCALE), 1))
+        small = cv2.resize(rgb, small_size, dst=scratch_buffer("small", (small_size[1], small_size[0], 3)),
+                           interpolation=cv2.INTER_AREA)
+        with timed("mtcnn"):
+            boxes, probs = self.gate_mtcnn.detect(to_tensor_view(small))
+        if boxes is None:
+            return FrameCheck(False, "No face detected")
+
+        # Boxes come largest first
+        box, prob = boxes[0] / PREFILTER_SCALE, float(probs[0])
+        if prob < FACE_DETECTION_CONFIDENCE:
+            return FrameCheck(False, "Face detection confidence too low", box, prob)
+
+        x1, y1, x2, y2 = [int(v) for v in box]
+        if min(x2 - x1, y2 - y1) < MIN_FACE_SIZE:
+            return FrameCheck(False, "Face is too small, move closer", box, prob)
+
+        face = gray[max(y1, 0):y2, max(x1, 0):x2]
+        if face.size == 0:
+            return FrameCheck(False, "No face detected", box, prob)
+        # Measure sharpness at a fixed size so it does not depend on resolution
+        face = cv2.resize(face, (self.mtcnn.image_size, self.mtcnn.image_size), interpolation=cv2.INTER_AREA)
+        if cv2.Laplacian(face, cv2.CV_64F).var() < MIN_SHARPNESS:
+            return FrameCheck(False, "Image is too blurry", box, prob)
+
+        return FrameCheck(True, "", box, prob)
+
+    def scan_face(self, image) -> Tuple[Optional[np.ndarray], str]:
+        """Gate a frame cheaply, then embed the face at original resolution"""
+        try:
+            with timed("colour_conversion"):
+                rgb = to_rgb_array(image)
+            check = self.check_frame(rgb)
+            if not check.passed:
+                self.rejections[check.reason] += 1
+                if check.reason == "No face detected":
+                    increment("no_face")
+                logger.info(f"Frame rejected: {check.reason}")
+                return None, check.reason
+
+            face = extract_face(rgb, check.box, self.mtcnn.image_size, self.mtcnn.margin)
+            face = fixed_image_standardization(face)
+            return self.embed_faces(face.unsqueeze(0))[0], ""
+
+        except Exception as e:
+            logger.error(f"Error in face embedding generation: {str(e)}")
+            return None, "Face processing failed"
 
     def get_face_embedding(self, image) -> Optional[np.ndarray]:
         """Get face embedding from image"""
+        if PREFILTER_ENABLED:
+            return self.scan_face(image)[0]
+
         try:
-            # Convert different image types to PIL Image
-            if isinstance(image, np.ndarray):
-                image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            elif isinstance(image, str):
-                image = Image.open(image)
-            
-            if not isinstance(image, Image.Image):
-                raise ValueError("Unsupported image type")
-
-            # Detect face
-            face = self.mtcnn(image)
-            if face is None:
+            # Convert different image types to an RGB array
+            with timed("colour_conversion"):
+                rgb = to_rgb_array(image)
+
+            # Detect face, largest first
+            with timed("mtcnn"):
+                boxes, _ = self.mtcnn.detect(to_tensor_view(rgb))
+            if boxes is None:
+                increment("no_face")
                 logger.warning("No face detected in image")
                 return None
 
             # Generate embedding
-            with torch.no_grad():
-                embedding = self.resnet(face.unsqueeze(0).to(self.device))
-                embedding = embedding.squeeze().cpu().numpy()
-
-            return embedding
+            face = fixed_image_standardization(extract_face(rgb, boxes[0], self.mtcnn.image_size, self.mtcnn.margin))
+            return self.embed_faces(face.unsqueeze(0))[0]
 
         except Exception as e:
             logger.error(f"Error in face embedding generation: {str(e)}")
             return None
 
-# Initialize global face processor
-face_processor = FaceProcessor()
+    def _detect_all(self, images: List[np.ndarray]):
+        """Run MTCNN over every RGB array, batching frames that share a size"""
+        if len(images) > 1 and len({img.shape for img in images}) == 1:
+            return self.mtcnn.detect(torch.from_numpy(np.stack(images)))
+        detections = [self.mtcnn.detect(to_tensor_view(img)) for img in images]
+        return [d[0] for d in detections], [d[1] for d in detections]
+
+    def _run_embedder(self, faces: torch.Tensor) -> np.ndarray:
+        """Embed a stack of standardized face crops in batched forward passes"""
+        started = time.perf_counter()
+        with timed("resnet"):
+            embeddings = [
+                self.embedder(faces[start:start + EMBEDDING_BATCH_SIZE])
+                for start in range(0, len(faces), EMBEDDING_BATCH_SIZE)
+            ]
+        if self.first_inference_seconds is None:
+            self.first_inference_seconds = time.perf_counter() - started
+            logger.info(f"First embedding pass took {self.first_inference_seconds:.2f}s")
+        return np.concatenate(embeddings)
+
+    def embed_faces(self, faces: torch.Tensor, use_cache: bool = True) -> np.ndarray:
+        """Embed face crops, only running the network on crops not already cached"""
+        cache = get_embedding_cache() if use_cache else None
+        if cache is None:
+            return self._run_embedder(faces)
+
+        keys = [crop_key(crop, self.model_version) for crop in faces.cpu().numpy()]
+        embeddings = np.empty((len(faces), EMBEDDING_DIM), dtype=np.float32)
+        pending = []
+        for i, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is None:
+                pending.append(i)
+            else:
+                embeddings[i] = cached
+
+        if pending:
+            computed = self._run_embedder(faces[pending])
+            embeddings[pending] = computed
+            for i, embedding in zip(pending, computed):
+                cache.put(keys[i], embedding)
+        return embeddings
+
+    def warm_up(self):
+        """Run dummy detection and embedding passes so the first real scan is not cold"""
+        started = time.perf_counter()
+        blank = torch.zeros((240, 320, 3), dtype=torch.uint8)
+        self.gate_mtcnn.detect(blank)
+        self.mtcnn.detect(blank)
+        self.embed_faces(torch.zeros(1, 3, self.mtcnn.image_size, self.mtcnn.image_size), use_cache=False)
+        logger.info(f"Face models warmed up in {time.perf_counter() - started:.2f}s "
+                    f"({time.perf_counter() - _IMPORTED_AT:.2f}s after import)")
+
+    def detect_faces(self, image) -> Tuple[np.ndarray, np.ndarray]:
+        """Boxes and probabilities of the confident faces in one frame, largest first"""
+        with timed("colour_conversion"):
+            rgb = to_rgb_array(image)
+        with timed("mtcnn"):
+            boxes, probs = self.mtcnn.detect(to_tensor_view(rgb))
+        if boxes is None:
+            increment("no_face")
+            return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32)
+        keep = np.asarray(probs, dtype=np.float32) >= FACE_DETECTION_CONFIDENCE
+        if not keep.any():
+            increment("no_face")
+        return np.asarray(boxes, dtype=np.float32)[keep], np.asarray(probs, dtype=np.float32)[keep]
+
+    def embed_boxes(self, image, boxes) -> np.ndarray:
+        """Embed the faces at the given boxes of one frame in a single pass"""
+        rgb = to_rgb_array(image)
+        crops = [
+            fixed_image_standardization(extract_face(rgb, box, self.mtcnn.image_size, self.mtcnn.margin))
+            for box in boxes
+        ]
+        return self.embed_faces(torch.stack(crops))
+
+    def get_face_embeddings(self, images) -> List[List[DetectedFace]]:
+        """Detect every face in a list of frames and embed them together"""
+        try:
+            with timed("colour_conversion"):
+                images = [to_rgb_array(image) for image in images]
+            with timed("mtcnn"):
+                batch_boxes, batch_probs = self._detect_all(images)
+
+            crops, owners = [], []
+            for i, (image, boxes, probs) in enumerate(zip(images, batch_boxes, batch_probs)):
+                if boxes is None:
+                    continue
+                for box, prob in zip(boxes, probs):
+                    if prob < FACE_DETECTION_CONFIDENCE:
+                        continue
+                    face = extract_face(image, box, self.mtcnn.image_size, self.mtcnn.margin)
+                    crops.append(fixed_image_standardization(face))
+                    owners.append((i, np.asarray(box, dtype=np.float32), float(prob)))
+
+            results = [[] for _ in images]
+            increment("no_face", len(images) - len({owner[0] for owner in owners}))
+            if not crops:
+                return results
+
+            embeddings = self.embed_faces(torch.stack(crops))
+            for (i, box, prob), embedding in zip(owners, embeddings):
+                results[i].append(DetectedFace(box, prob, embedding))
+            return results
+
+        except Exception as e:
+            logger.error(f"Error in batched face embedding: {str(e)}")
+            return [[] for _ in images]
+
+# Global face processor, built on first use and shared by every session
+_face_processor: Optional[FaceProcessor] = None
+_processor_lock = threading.Lock()
+_warm_up_thread: Optional[threading.Thread] = None
+
+def get_face_processor() -> FaceProcessor:
+    """Return the process-wide face processor, loading the models once"""
+    global _face_processor
+    with _processor_lock:
+        if _face_processor is None:
+            _face_processor = FaceProcessor()
+        return _face_processor
+
+def _warm_up():
+    try:
+        get_face_processor().warm_up()
+    except Exception as e:
+        logger.error(f"Face model warm-up failed: {str(e)}")
+
+def start_warm_up():
+    """Load and warm the models in a background thread, at most once per process"""
+    global _warm_up_thread
+    with _processor_lock:
+        if _warm_up_thread is None and MODEL_WARMUP:
+            _warm_up_thread = threading.Thread(target=_warm_up, name="face-model-warm-up", daemon=True)
+            _warm_up_thread.start()
 
 def get_face_embedding(image) -> Optional[np.ndarray]:
     """Global function to get face embedding"""
-    return face_processor.get_face_embedding(image)
\ No newline at end of file
+    return get_face_processor().get_face_embedding(image)
+
+def scan_face(image) -> Tuple[Optional[np.ndarray], str]:
+    """Global function to get a face embedding or the reason the frame was rejected"""
+    if not PREFILTER_ENABLED:
+        embedding = get_face_processor().get_face_embedding(image)
+        return embedding, "" if embedding is not None else "No face detected"
+    return get_face_processor().scan_face(image)
+
+def get_face_embeddings(images) -> List[List[DetectedFace]]:
+    """Global function to embed every face in a batch of frames"""
+    return get_face_processor().get_face_embeddings(images)
+
+def detect_faces(image) -> Tuple[np.ndarray, np.ndarray]:
+    """Global function to detect the confident faces in a frame"""
+    return get_face_processor().detect_faces(image)
+
+def embed_face_boxes(image, boxes) -> np.ndarray:
+    """Global function to embed already detected faces of a frame"""
+    return get_face_processor().embed_boxes(image, boxes)
+
+def embed_enrolment_burst(frames) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], str]:
+    """Embed a burst of frames in one pass and return (centroid, samples, error)"""
+    detections = get_face_embeddings(frames)
+    # The largest face in each frame is the one being enrolled
+    samples = np.array([faces[0].embedding for faces in detections if faces], dtype=np.float32)
+    if len(samples) < ENROLMENT_MIN_SAMPLES:
+        return None, None, "Face not detected in enough frames"
+
+    samples /= np.linalg.norm(samples, axis=1, keepdims=True)
+    centroid = samples.mean(axis=0)
+    centroid /= np.linalg.norm(centroid)
+    samples = samples[1.0 - samples @ centroid <= ENROLMENT_OUTLIER_DISTANCE]
+    if len(samples) < ENROLMENT_MIN_SAMPLES:
+        return None, None, "Captured frames are too inconsistent"
+
+    centroid = samples.mean(axis=0)
+    centroid /= np.linalg.norm(centroid)
+    return centroid, samples, ""
@@ -0,0 +1,79 @@
+import logging
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import FRAME_POOL_SIZE
+from helpers.face_utils import RgbFrame
+from helpers.metrics import timed
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FramePool:
+    """Preallocated frame buffers, handed out again once nothing else references them"""
+
+    def __init__(self, size: int = FRAME_POOL_SIZE):
+        self.size = size
+        self._buffers: List[np.ndarray] = []
+        self._lock = threading.Lock()
+
+    def take(self, shape: Tuple[int, ...]) -> np.ndarray:
+        with self._lock:
+            for i in range(len(self._buffers)):
+                # Free when only the pool list and getrefcount's argument hold it
+                if sys.getrefcount(self._buffers[i]) > 2:
+                    continue
+                if self._buffers[i].shape != shape:
+                    self._buffers[i] = np.empty(shape, dtype=np.uint8)
+                return self._buffers[i]
+            buffer = np.empty(shape, dtype=np.uint8)
+            if len(self._buffers) < self.size:
+                self._buffers.append(buffer)
+            return buffer
+
+
+class FrameIngest:
+    """Decodes WebRTC frames straight to RGB, once per frame"""
+
+    def __init__(self, pool_size: int = FRAME_POOL_SIZE):
+        self.pool = FramePool(pool_size)
+
+    def decode(self, frame) -> RgbFrame:
+        """RGB view of an av.VideoFrame, copied only when its rows are padded"""
+        with timed("frame_decode"):
+            rgb = frame.to_ndarray(format="rgb24")
+            if not rgb.flags.c_contiguous:
+                buffer = self.pool.take(rgb.shape)
+                np.copyto(buffer, rgb)
+                rgb = buffer
+        return rgb.view(RgbFrame)
+
+
+# Snapshot JPEGs are encoded and written off the request path
+_writer: Optional[ThreadPoolExecutor] = None
+_writer_lock = threading.Lock()
+
+
+def _write_snapshot(rgb: np.ndarray, path: str):
+    try:
+        if not cv2.imwrite(path, cv2.cvtColor(np.asarray(rgb), cv2.COLOR_RGB2BGR)):
+            logger.error(f"Could not write snapshot {path}")
+    except Exception as e:
+        logger.error(f"Error writing snapshot {path}: {str(e)}")
+
+
+def save_snapshot(rgb: np.ndarray, path) -> Future:
+    """Queue an RGB frame to be saved as a JPEG; the future resolves once it is on disk"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-writer")
+    # The queued task keeps the frame referenced, so its pooled buffer is not reused meanwhile
+    return _writer.submit(_write_snapshot, rgb, str(path))
@@ -0,0 +1,380 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import (ANN_ENABLED, ANN_FALLBACK_MARGIN, ANN_MIN_GALLERY_SIZE, ANN_SAVE_ROWS, EMBEDDING_DIM,
+                    FACE_MATCH_THRESHOLD, GALLERY_POLL_INTERVAL, MATCH_TOP_K, STUDENT_COLUMNS)
+from helpers.ann_index import load_or_build, save_index
+from helpers.db_utils import add_registration_listener, read_samples_since, read_students_since
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise embeddings row-wise as float32"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    # Rows read back from the store are already unit length and are kept bit-for-bit
+    norms[(norms == 0) | (np.abs(norms - 1.0) < 1e-5)] = 1.0
+    return vectors / norms
+
+
+class ReadWriteLock:
+    """Any number of concurrent readers or a single writer; a waiting writer holds off new readers"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class EmbeddingGallery:
+    """Enrolled centroid embeddings held as one normalised float32 matrix"""
+
+    def __init__(self, dim: int = EMBEDDING_DIM, capacity: int = 64, use_index: bool = True):
+        self.dim = dim
+        self.use_index = use_index
+        self._matrix = np.empty((capacity, dim), dtype=np.float32)
+        self._size = 0
+        self.students: List[dict] = []
+        self._index = {}
+        # Searches from every kiosk session run concurrently; additions wait for them
+        self._lock = ReadWriteLock()
+        # Optional ANN index; galleries below ANN_MIN_GALLERY_SIZE are scanned exactly
+        self.index = None
+        # Rows added to the index since it was last persisted
+        self._unsaved = 0
+        self._save_lock = threading.Lock()
+        # Per-sample enrolment vectors by matric number, used to refine centroid hits
+        self.samples: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._matrix[:self._size]
+
+    @classmethod
+    def from_store(cls, df: pd.DataFrame, matrix: np.ndarray,
+                   use_index: bool = True) -> "EmbeddingGallery":
+        """Wrap already-normalised store rows without copying them"""
+        if len(df) != len(matrix):
+            raise ValueError(f"{len(df)} student rows but {len(matrix)} embedding rows")
+        gallery = cls(use_index=use_index)
+        if len(matrix):
+            # The mapped rows are only copied once the gallery has to grow
+            gallery._matrix = matrix
+            gallery._size = len(matrix)
+            gallery.students = df[STUDENT_COLUMNS].to_dict("records")
+            gallery._index = {r["Matric No"]: i for i, r in enumerate(gallery.students)}
+            gallery._build_index()
+        return gallery
+
+    def _build_index(self):
+        if (ANN_ENABLED and self.use_index and self.index is None
+                and self._size >= ANN_MIN_GALLERY_SIZE):
+            self.index = load_or_build(self.matrix)
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= len(self._matrix):
+            return
+        capacity = max(needed, 2 * len(self._matrix))
+        grown = np.empty((capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def add_many(self, records: List[dict], vectors: np.ndarray):
+        """Append students and their embeddings to the gallery"""
+        vectors = _normalize(np.reshape(vectors, (-1, self.dim)))
+        if len(records) != len(vectors):
+            raise ValueError("Records and embeddings differ in length")
+        with self._lock.write():
+            self._reserve(len(vectors))
+            start = self._size
+            self._matrix[start:start + len(vectors)] = vectors
+            for record in records:
+                self._index[record["Matric No"]] = len(self.students)
+                self.students.append(record)
+            self._size += len(vectors)
+
+            if self.index is not None:
+                self.index.add(vectors, start)
+                self._unsaved += len(vectors)
+            else:
+                self._build_index()
+
+        if self._unsaved >= ANN_SAVE_ROWS:
+            self.save_index()
+
+    def save_index(self):
+        """Persist the ANN index; rows added after the last save are topped up on the next load"""
+        with self._save_lock, self._lock.read():
+            if self.index is None or not self._unsaved:
+                return
+            save_index(self.index, self.matrix)
+            self._unsaved = 0
+
+    def add(self, record: dict, embedding, samples=None) -> None:
+        """Append a single student to the gallery"""
+        self.add_many([record], np.asarray(embedding, dtype=np.float32))
+        if samples is not None and len(samples):
+            self.set_samples([record["Matric No"]] * len(samples), samples)
+
+    def set_samples(self, owners: List[str], vectors: np.ndarray):
+        """Attach per-sample vectors to the students in this gallery"""
+        keep = np.array([owner in self._index for owner in owners], dtype=bool)
+        if not keep.any():
+            return
+        vectors = _normalize(np.reshape(vectors, (-1, self.dim))[np.flatnonzero(keep)])
+        grouped: Dict[str, List[np.ndarray]] = {}
+        for owner, vector in zip((o for o, k in zip(owners, keep) if k), vectors):
+            grouped.setdefault(owner, []).append(vector)
+        with self._lock.write():
+            for owner, owned in grouped.items():
+                existing = self.samples.get(owner)
+                owned = np.stack(owned)
+                self.samples[owner] = owned if existing is None else np.concatenate([existing, owned])
+
+    def contains(self, matric_no: str) -> bool:
+        return matric_no in self._index
+
+    def replace(self, other: "EmbeddingGallery"):
+        """Take over another gallery's students in one step, keeping this object for sessions holding it"""
+        with self._lock.write():
+            self._matrix, self._size = other._matrix, other._size
+            self.students, self._index = other.students, other._index
+            self.index, self._unsaved = other.index, other._unsaved
+            self.samples = other.samples
+
+    def subset(self, keep: Callable[[dict], bool]) -> "EmbeddingGallery":
+        """Exact-search copy of the students for which `keep` is true"""
+        with self._lock.read():
+            rows = [i for i, student in enumerate(self.students) if keep(student)]
+            subset = EmbeddingGallery(self.dim, capacity=max(len(rows), 1), use_index=False)
+            subset._matrix[:len(rows)] = self._matrix[rows]
+            subset._size = len(rows)
+            subset.students = [self.students[i] for i in rows]
+            subset._index = {s["Matric No"]: i for i, s in enumerate(subset.students)}
+            subset.samples = {m: self.samples[m] for m in subset._index if m in self.samples}
+        return subset
+
+    def search(self, embedding, k: int = 1, exact: bool = False) -> List[Tuple[dict, float]]:
+        """Return the k closest students as (record, cosine distance) pairs"""
+        query = _normalize(np.reshape(embedding, (self.dim,)))
+        with self._lock.read():
+            if self._size == 0:
+                return []
+
+            rows = None
+            if self.index is not None and not exact:
+                rows = self.index.candidates(query)
+            if rows is None or len(rows) == 0:
+                rows = np.arange(self._size)
+                distances = 1.0 - self.matrix @ query
+            else:
+                distances = 1.0 - self._matrix[rows] @ query
+
+            k = min(k, len(rows))
+            top = np.argpartition(distances, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(distances[top])]
+            return [(self.students[rows[i]], float(distances[i])) for i in top]
+
+    def best_match(self, embedding, exact: bool = False,
+                   fallback: bool = True) -> Tuple[Optional[dict], float]:
+        """Return the closest student and its cosine distance.
+
+        An approximate result just past FACE_MATCH_THRESHOLD, within
+        ANN_FALLBACK_MARGIN, is checked again exactly. Clear non-matches are not,
+        so unknown faces cost one ANN probe rather than a probe plus a full scan.
+        """
+        student, distance = self._best_match(embedding, exact)
+        if (fallback and not exact and self.index is not None
+                and FACE_MATCH_THRESHOLD <= distance < FACE_MATCH_THRESHOLD + ANN_FALLBACK_MARGIN):
+            return self._best_match(embedding, exact=True)
+        return student, distance
+
+    def _best_match(self, embedding, exact: bool) -> Tuple[Optional[dict], float]:
+        results = self.search(embedding, k=MATCH_TOP_K if self.samples else 1, exact=exact)
+        if not results:
+            return None, float('inf')
+        if not self.samples:
+            return results[0]
+
+        # Refine the centroid shortlist on each candidate's closest enrolment sample
+        query = _normalize(np.reshape(embedding, (self.dim,)))
+        refined = []
+        with self._lock.read():
+            for student, distance in results:
+                samples = self.samples.get(student["Matric No"])
+                if samples is not None:
+                    distance = min(distance, float(1.0 - np.max(samples @ query)))
+                refined.append((student, distance))
+        return min(refined, key=lambda result: result[1])
+
+
+_gallery: Optional[EmbeddingGallery] = None
+_gallery_lock = threading.Lock()
+
+# Scoped galleries keyed by (departments, roster), least recently used first
+_shards: "OrderedDict[Tuple[frozenset, frozenset], EmbeddingGallery]" = OrderedDict()
+_MAX_SHARDS = 32
+
+# Store positions already applied to the gallery and its shards
+_student_cursor = 0
+_sample_cursor = 0
+_watcher: Optional[threading.Thread] = None
+
+
+def _department_key(department) -> str:
+    return str(department).strip().lower()
+
+
+def _in_scope(record: dict, departments: frozenset, roster: frozenset) -> bool:
+    return _department_key(record["Department"]) in departments or record["Matric No"] in roster
+
+
+def _apply_students(df: pd.DataFrame, vectors: np.ndarray) -> int:
+    records = df[STUDENT_COLUMNS].to_dict("records")
+    new = [i for i, record in enumerate(records) if not _gallery.contains(record["Matric No"])]
+    if not new:
+        return 0
+    records, vectors = [records[i] for i in new], np.asarray(vectors)[new]
+    _gallery.add_many(records, vectors)
+    for (departments, roster), shard in _shards.items():
+        scoped = [i for i, record in enumerate(records)
+                  if _in_scope(record, departments, roster) and not shard.contains(record["Matric No"])]
+        if scoped:
+            shard.add_many([records[i] for i in scoped], vectors[scoped])
+    return len(new)
+
+
+def _reload_locked() -> int:
+    """Rebuild the gallery and its shards from the whole store, then swap them in"""
+    global _student_cursor, _sample_cursor
+    df, matrix, student_cursor = read_students_since(0)
+    owners, samples, sample_cursor = read_samples_since(0)
+    fresh = EmbeddingGallery.from_store(df, matrix)
+    fresh.set_samples(owners, samples)
+    # Searches keep using the old rows until here, so they never see an empty gallery
+    _gallery.replace(fresh)
+    for key, shard in _shards.items():
+        shard.replace(fresh.subset(lambda record: _in_scope(record, *key)))
+    _student_cursor, _sample_cursor = student_cursor, sample_cursor
+    return len(fresh)
+
+
+def refresh_gallery() -> int:
+    """Apply students and samples added to the store since the last refresh, by any process"""
+    global _student_cursor, _sample_cursor
+    with _gallery_lock:
+        if _gallery is None:
+            return 0
+        try:
+            df, vectors, student_cursor = read_students_since(_student_cursor)
+            owners, samples, sample_cursor = read_samples_since(_sample_cursor)
+        except ValueError as e:
+            # The store was rebuilt or truncated, so positions no longer line up
+            logger.warning(f"Student store was rewritten, reloading the gallery: {str(e)}")
+            reloaded = _reload_locked()
+            logger.info(f"Gallery reloaded with {reloaded} students")
+            return reloaded
+
+        # Students first, as set_samples ignores owners the gallery does not hold yet
+        added = _apply_students(df, vectors)
+        if owners:
+            _gallery.set_samples(owners, samples)
+            for shard in _shards.values():
+                shard.set_samples(owners, samples)
+        _student_cursor, _sample_cursor = student_cursor, sample_cursor
+
+    if added:
+        logger.info(f"Added {added} newly enrolled students to the gallery")
+    return added
+
+
+def _watch():
+    while True:
+        time.sleep(GALLERY_POLL_INTERVAL)
+        try:
+            refresh_gallery()
+        except Exception as e:
+            logger.error(f"Error refreshing gallery: {str(e)}")
+
+
+def _on_student_registered(record: dict, embedding: list, samples: Optional[list]):
+    # Registrations in this process are applied right away rather than at the next poll
+    refresh_gallery()
+
+
+def get_gallery() -> EmbeddingGallery:
+    """Process-wide gallery, loaded once and then kept current from the store"""
+    global _gallery, _student_cursor, _sample_cursor, _watcher
+    with _gallery_lock:
+        if _gallery is None:
+            df, matrix, _student_cursor = read_students_since(0)
+            _gallery = EmbeddingGallery.from_store(df, matrix)
+            owners, samples, _sample_cursor = read_samples_since(0)
+            _gallery.set_samples(owners, samples)
+            add_registration_listener(_on_student_registered)
+            _watcher = threading.Thread(target=_watch, name="gallery-watcher", daemon=True)
+            _watcher.start()
+            logger.info(f"Embedding gallery loaded with {len(_gallery)} students")
+        return _gallery
+
+
+def get_shard(departments: Iterable[str] = (), roster: Iterable[str] = ()) -> Optional[EmbeddingGallery]:
+    """Gallery limited to some departments and/or a roster of matric numbers"""
+    key = (frozenset(_department_key(d) for d in departments), frozenset(roster))
+    if not key[0] and not key[1]:
+        return None
+    gallery = get_gallery()
+    with _gallery_lock:
+        shard = _shards.get(key)
+        if shard is None:
+            # Copied from the shared gallery, so the store is not read again
+            shard = gallery.subset(lambda record: _in_scope(record, *key))
+            logger.info(f"Built scoped gallery with {len(shard)} students")
+            if len(_shards) >= _MAX_SHARDS:
+                _shards.popitem(last=False)
+        _shards[key] = shard
+        _shards.move_to_end(key)
+        return shard
@@ -0,0 +1,240 @@
+import fcntl
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+from config import (BACKEND_PARITY_FACES, BACKEND_PARITY_TOLERANCE, FACE_MATCH_THRESHOLD, FACES_DIR,
+                    INFERENCE_BACKEND, INFERENCE_THREADS, MODEL_CACHE_DIR)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKENDS = ["eager", "torchscript", "int8", "onnx"]
+
+# embedder(standardized face batch N x 3 x 160 x 160) -> N x 512 embeddings
+Embedder = Callable[[torch.Tensor], np.ndarray]
+
+_EXAMPLE_SHAPE = (1, 3, 160, 160)
+
+
+def configure_threads():
+    """Apply INFERENCE_THREADS to torch's intra-op thread pool"""
+    if INFERENCE_THREADS > 0:
+        torch.set_num_threads(INFERENCE_THREADS)
+
+
+def _artifact_path(backend: str, suffix: str):
+    MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    version = torch.__version__.replace("+", "_")
+    return MODEL_CACHE_DIR / f"inception_resnet_v1_{backend}_torch{version}{suffix}"
+
+
+def _replace_file(path, write):
+    """Write a file through a temporary sibling so readers never see it half written"""
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        write(temporary)
+        os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+
+
+@contextmanager
+def _artifact_lock(path):
+    """Serialise building a cached artifact between processes, such as bulk enrolment workers"""
+    with open(path.with_name(path.name + ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def parity_faces(detector=None, count: int = BACKEND_PARITY_FACES) -> Optional[torch.Tensor]:
+    """Standardised face crops that every backend is checked on.
+
+    Cropped by `detector` (an MTCNN) from the first enrolled photos and saved, so
+    later checks compare backends on the same faces. None until a photo is enrolled.
+    """
+    path = MODEL_CACHE_DIR / "parity_faces.pt"
+    if path.exists():
+        return torch.load(path)
+    if detector is None:
+        return None
+    MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with _artifact_lock(path):
+        if path.exists():
+            return torch.load(path)
+        return _crop_parity_faces(detector, count, path)
+
+
+def _crop_parity_faces(detector, count: int, path) -> Optional[torch.Tensor]:
+    crops = []
+    for photo in sorted(FACES_DIR.glob("*.jpg")):
+        image = cv2.imread(str(photo))
+        if image is None:
+            continue
+        face = detector(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if face is not None:
+            crops.append(face.cpu())
+        if len(crops) == count:
+            break
+    if not crops:
+        return None
+
+    faces = torch.stack(crops)
+    _replace_file(path, lambda temporary: torch.save(faces, temporary))
+    logger.info(f"Saved {len(crops)} parity face crops to {path}")
+    return faces
+
+
+def _eager(resnet, device) -> Embedder:
+    def embed(faces: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return resnet(faces.to(device)).cpu().numpy()
+    return embed
+
+
+def _jit(model, path) -> Embedder:
+    """Trace and freeze a model, or load a previously saved trace"""
+    with _artifact_lock(path):
+        if path.exists():
+            traced = torch.jit.load(str(path), map_location="cpu")
+        else:
+            with torch.no_grad():
+                traced = torch.jit.freeze(torch.jit.trace(model, torch.zeros(_EXAMPLE_SHAPE)))
+            _replace_file(path, lambda temporary: traced.save(str(temporary)))
+            logger.info(f"Saved traced model to {path}")
+
+    def embed(faces: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return traced(faces.cpu()).numpy()
+    return embed
+
+
+def _int8(resnet) -> Embedder:
+    # Dynamic quantization only rewrites Linear layers; convolutions stay fp32
+    quantized = torch.ao.quantization.quantize_dynamic(resnet.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+    return _jit(quantized, _artifact_path("int8", ".pt"))
+
+
+def _onnx(resnet) -> Embedder:
+    import onnxruntime as ort
+
+    path = _artifact_path("onnx", ".onnx")
+    with _artifact_lock(path):
+        if not path.exists():
+            _replace_file(path, lambda temporary: torch.onnx.export(
+                resnet.cpu(), torch.zeros(_EXAMPLE_SHAPE), str(temporary),
+                input_names=["faces"], output_names=["embeddings"],
+                dynamic_axes={"faces": {0: "batch"}, "embeddings": {0: "batch"}},
+                opset_version=13
+            ))
+            logger.info(f"Exported ONNX model to {path}")
+
+    options = ort.SessionOptions()
+    if INFERENCE_THREADS > 0:
+        options.intra_op_num_threads = INFERENCE_THREADS
+    session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+    def embed(faces: torch.Tensor) -> np.ndarray:
+        return session.run(None, {"faces": faces.cpu().numpy().astype(np.float32)})[0]
+    return embed
+
+
+def _pairwise_distances(embeddings: np.ndarray) -> np.ndarray:
+    normed = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return 1.0 - normed @ normed.T
+
+
+def check_parity(reference: Embedder, candidate: Embedder, faces: torch.Tensor,
+                 tolerance: float = BACKEND_PARITY_TOLERANCE) -> Tuple[bool, str]:
+    """Compare cosine distances on real face crops from a backend against the fp32 reference"""
+    ref = reference(faces)
+    cand = candidate(faces)
+
+    self_dist = 1.0 - np.sum(ref * cand, axis=1) / (
+        np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1))
+    ref_pairs, cand_pairs = _pairwise_distances(ref), _pairwise_distances(cand)
+    pair_error = np.abs(ref_pairs - cand_pairs).max()
+    flipped = np.sum((ref_pairs < FACE_MATCH_THRESHOLD) != (cand_pairs < FACE_MATCH_THRESHOLD))
+
+    message = (f"max self distance {self_dist.max():.4f}, max pairwise error {pair_error:.4f}, "
+               f"{flipped} match decisions flipped at {FACE_MATCH_THRESHOLD}")
+    ok = self_dist.max() <= tolerance and pair_error <= tolerance and flipped == 0
+    return ok, message
+
+
+def build_embedder(resnet, device, backend: str = INFERENCE_BACKEND,
+                   detector=None) -> Tuple[Embedder, str]:
+    """Build the configured embedding backend, falling back to eager fp32.
+
+    Returns the embedder and the name of the backend it actually runs, which
+    differs from `backend` after a fallback. `detector` crops the parity faces.
+    """
+    configure_threads()
+    reference = _eager(resnet, device)
+    if backend == "eager":
+        return reference, "eager"
+    if backend not in BACKENDS:
+        logger.error(f"Unknown inference backend {backend}, using eager")
+        return reference, "eager"
+    if device.type != "cpu":
+        logger.info(f"Inference backend {backend} targets CPU, using eager on {device}")
+        return reference, "eager"
+
+    try:
+        faces = parity_faces(detector)
+        if faces is None:
+            logger.info(f"No enrolled face photos to check inference backend {backend} on yet, using eager")
+            return reference, "eager"
+
+        if backend == "torchscript":
+            candidate = _jit(resnet, _artifact_path("torchscript", ".pt"))
+        elif backend == "int8":
+            candidate = _int8(resnet)
+        else:
+            candidate = _onnx(resnet)
+
+        ok, message = check_parity(reference, candidate, faces)
+        if not ok:
+            logger.error(f"Inference backend {backend} failed parity check ({message}), using eager")
+            return reference, "eager"
+        logger.info(f"Using inference backend {backend} ({message})")
+        return candidate, backend
+
+    except Exception as e:
+        logger.error(f"Error building inference backend {backend}: {str(e)}")
+        return reference, "eager"
+
+
+def benchmark(batch_size: int = 8, repeats: int = 10):
+    """Print per-face latency and parity for every backend"""
+    from facenet_pytorch import MTCNN, InceptionResnetV1
+
+    resnet = InceptionResnetV1(pretrained='vggface2').eval()
+    device = torch.device('cpu')
+    faces = torch.randn(batch_size, *_EXAMPLE_SHAPE[1:])
+    reference = _eager(resnet, device)
+    crops = parity_faces(MTCNN(image_size=160, margin=0, device=device))
+    for backend in BACKENDS:
+        embedder, used = build_embedder(resnet, device, backend)
+        embedder(faces)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            embedder(faces)
+        per_face = (time.perf_counter() - started) / (repeats * batch_size)
+        if crops is None:
+            parity = "not checked, no enrolled face photos"
+        else:
+            ok, message = check_parity(reference, embedder, crops)
+            parity = f"{'ok' if ok else 'FAILED'}: {message}"
+        print(f"{backend:12s} ({used}) {per_face * 1000:7.2f} ms/face  parity {parity}")
+
+
+if __name__ == "__main__":
+    benchmark()
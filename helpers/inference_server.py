@@ -0,0 +1,196 @@
+"""Shared embedding inference with cross-request micro-batching.
+
+    python -m helpers.inference_server [--port 8765]
+
+INFERENCE_MODE selects how FaceProcessor embeds face crops:
+
+    local    each process runs its own InceptionResnetV1 (the default)
+    batched  one model per process behind a MicroBatcher, so concurrent
+             sessions share forward passes
+    client   crops are sent to this server, which owns the only model and
+             micro-batches requests from every kiosk; clients keep MTCNN only
+"""
+import argparse
+import io
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+import numpy as np
+import torch
+
+from config import (INFERENCE_BATCH_WINDOW, INFERENCE_MAX_BATCH, INFERENCE_SERVER_URL,
+                    INFERENCE_TIMEOUT)
+from helpers.inference_backends import Embedder
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _to_bytes(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array, dtype=np.float32))
+    return buffer.getvalue()
+
+
+def _from_bytes(data: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+class MicroBatcher:
+    """Embedder that merges crops submitted within a short window into one forward pass"""
+
+    def __init__(self, embedder: Embedder, window: float = INFERENCE_BATCH_WINDOW,
+                 max_batch: int = INFERENCE_MAX_BATCH):
+        self.embedder = embedder
+        self.window = window
+        self.max_batch = max_batch
+        self._requests: "queue.Queue[Tuple[torch.Tensor, Future]]" = queue.Queue()
+        self.batches = 0
+        self.faces = 0
+        threading.Thread(target=self._run, name="inference-batcher", daemon=True).start()
+
+    def submit(self, faces: torch.Tensor) -> Future:
+        """Queue a stack of standardized crops; the future resolves to their embeddings"""
+        future = Future()
+        self._requests.put((faces, future))
+        return future
+
+    def __call__(self, faces: torch.Tensor) -> np.ndarray:
+        return self.submit(faces).result()
+
+    def _collect(self) -> List[Tuple[torch.Tensor, Future]]:
+        """Block for one request, then take whatever else arrives within the window"""
+        pending = [self._requests.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(request)
+            size += len(request[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            try:
+                embeddings = self.embedder(torch.cat([faces.cpu() for faces, _ in pending]))
+            except Exception as e:
+                logger.error(f"Error in batched inference: {str(e)}")
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            start = 0
+            for faces, future in pending:
+                future.set_result(embeddings[start:start + len(faces)])
+                start += len(faces)
+            self.faces += start
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "faces": self.faces,
+                "mean_batch": self.faces / self.batches if self.batches else 0.0}
+
+
+class RemoteEmbedder:
+    """Embedder that sends crops to the inference server"""
+
+    def __init__(self, url: str = INFERENCE_SERVER_URL, timeout: float = INFERENCE_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def __call__(self, faces: torch.Tensor) -> np.ndarray:
+        request = urllib.request.Request(
+            f"{self.url}/embed", data=_to_bytes(faces.cpu().numpy()),
+            headers={"Content-Type": "application/octet-stream"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return _from_bytes(response.read())
+
+    def health(self) -> dict:
+        with urllib.request.urlopen(f"{self.url}/health", timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+def _handler(batcher: MicroBatcher, model_version: str):
+    class InferenceHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self.send_error(404)
+                return
+            body = json.dumps({"model_version": model_version, **batcher.stats()}).encode("utf-8")
+            self._reply(200, body, "application/json")
+
+        def do_POST(self):
+            if self.path != "/embed":
+                self.send_error(404)
+                return
+            try:
+                faces = _from_bytes(self.rfile.read(int(self.headers["Content-Length"])))
+                embeddings = batcher(torch.from_numpy(faces))
+                self._reply(200, _to_bytes(embeddings), "application/octet-stream")
+            except Exception as e:
+                logger.error(f"Error serving embedding request: {str(e)}")
+                self._reply(500, str(e).encode("utf-8"), "text/plain")
+
+        def log_message(self, format, *args):
+            pass
+
+    return InferenceHandler
+
+
+def serve(host: str, port: int):
+    """Load one model and serve micro-batched embeddings until interrupted"""
+    from facenet_pytorch import MTCNN, InceptionResnetV1
+
+    from helpers.inference_backends import build_embedder
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    resnet = InceptionResnetV1(pretrained='vggface2').eval().to(device)
+    embedder, backend = build_embedder(resnet, device, detector=MTCNN(image_size=160, margin=0, device=device))
+    batcher = MicroBatcher(embedder)
+    # Warm the model so the first kiosk request is not cold
+    batcher(torch.zeros(1, 3, 160, 160))
+
+    model_version = f"inception_resnet_v1-vggface2-{backend}"
+    server = ThreadingHTTPServer((host, port), _handler(batcher, model_version))
+    logger.info(f"Inference server listening on {host}:{port} ({model_version})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve face embeddings to attendance kiosks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
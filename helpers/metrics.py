@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import numpy as np
+
+from config import METRICS_BUCKETS, METRICS_PORT, METRICS_WINDOW
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pipeline stages in the order a frame passes through them
+STAGES = ["frame_decode", "colour_conversion", "mtcnn", "resnet", "gallery_search",
+          "storage_write", "storage_flush"]
+EVENTS = ["no_face", "no_match", "duplicate"]
+
+
+class StageHistogram:
+    """Recent latencies for percentiles plus cumulative buckets for scraping"""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.recent = deque(maxlen=window)
+        self.buckets = [0] * (len(METRICS_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.recent.append(seconds)
+        self.buckets[bisect_left(METRICS_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+
+class Metrics:
+    """Process-wide stage timings and event counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, StageHistogram] = {}
+        self.events: Dict[str, int] = {event: 0 for event in EVENTS}
+        self.started = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = StageHistogram()
+            histogram.observe(seconds)
+
+    def increment(self, event: str, amount: int = 1):
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + amount
+
+    def snapshot(self) -> dict:
+        """Percentiles over each stage's rolling window, and event totals"""
+        with self._lock:
+            stages = {name: (list(h.recent), h.count, h.total) for name, h in self.stages.items()}
+            events = dict(self.events)
+
+        summary = {}
+        for name in sorted(stages, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            recent, count, total = stages[name]
+            ms = np.asarray(recent) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+            summary[name] = {"count": count, "p50_ms": float(p50), "p95_ms": float(p95),
+                             "p99_ms": float(p99), "mean_ms": 1000 * total / count if count else 0.0}
+        return {"stages": summary, "events": events, "uptime_s": time.time() - self.started}
+
+    def prometheus_text(self) -> str:
+        """Render the metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP attendance_stage_seconds Time spent in each recognition pipeline stage.",
+            "# TYPE attendance_stage_seconds histogram",
+        ]
+        with self._lock:
+            for name, histogram in self.stages.items():
+                cumulative = 0
+                for bound, hits in zip(METRICS_BUCKETS, histogram.buckets):
+                    cumulative += hits
+                    lines.append(f'attendance_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'attendance_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'attendance_stage_seconds_sum{{stage="{name}"}} {histogram.total}')
+                lines.append(f'attendance_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+
+            lines.append("# HELP attendance_events_total Recognition outcomes that did not mark attendance.")
+            lines.append("# TYPE attendance_events_total counter")
+            for event, count in self.events.items():
+                lines.append(f'attendance_events_total{{event="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.events = {event: 0 for event in EVENTS}
+            self.started = time.time()
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of the enclosed block under `stage`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(stage, time.perf_counter() - started)
+
+
+def increment(event: str, amount: int = 1):
+    metrics.increment(event, amount)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve /metrics for Prometheus on `port`, at most once per process; 0 disables it"""
+    global _server
+    with _server_lock:
+        if _server is not None or not port:
+            return
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint on port {port}: {str(e)}")
+            return
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Serving Prometheus metrics on :{port}/metrics")
@@ -0,0 +1,127 @@
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from config import STREAM_CONFIRM_FRAMES, STREAM_QUEUE_SIZE
+from helpers.db_utils import log_attendance
+from helpers.face_tracker import FaceTracker
+from helpers.face_utils import detect_faces, embed_face_boxes
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# matcher(embedding) -> (match_found, distance, student record)
+Matcher = Callable[[np.ndarray], Tuple[bool, float, Optional[dict]]]
+
+
+class RecognitionWorker:
+    """Background thread that recognises faces from a live frame stream"""
+
+    def __init__(self, matcher: Matcher, confirm_frames: int = STREAM_CONFIRM_FRAMES,
+                 queue_size: int = STREAM_QUEUE_SIZE):
+        self.matcher = matcher
+        self.confirm_frames = confirm_frames
+        self._frames = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="recognition-worker", daemon=True)
+
+        # Live state read by the UI thread
+        self.face_detected = False
+        self.detection_confidence = 0.0
+        self.last_distance = float('inf')
+        self.events = deque(maxlen=20)
+
+        # Identities must agree over confirm_frames embeddings of the same track
+        self.tracker = FaceTracker(confirm_frames)
+        self._marked = set()
+
+        # Adaptive frame skipping
+        self._frame_count = 0
+        self._last_frame_time = None
+        self._frame_interval = 1 / 30
+        self._inference_time = 0.0
+        self.stride = 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def submit(self, frame: np.ndarray):
+        """Offer a frame, dropping it or older queued frames when behind"""
+        now = time.monotonic()
+        if self._last_frame_time is not None:
+            self._frame_interval = 0.9 * self._frame_interval + 0.1 * (now - self._last_frame_time)
+        self._last_frame_time = now
+
+        self._frame_count += 1
+        if self._frame_count % self.stride:
+            return
+
+        while True:
+            try:
+                self._frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self._frames.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                frame = self._frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            started = time.monotonic()
+            try:
+                self._process(frame)
+            except Exception as e:
+                logger.error(f"Error in recognition worker: {str(e)}")
+            elapsed = time.monotonic() - started
+
+            # Only hand over as many frames as inference can keep up with
+            self._inference_time = 0.8 * self._inference_time + 0.2 * elapsed
+            self.stride = max(1, math.ceil(self._inference_time / max(self._frame_interval, 1e-3)))
+
+    def _process(self, frame: np.ndarray):
+        # Frames from FrameIngest are already RGB, so detection reads them in place
+        boxes, probs = detect_faces(frame)
+        self.face_detected = bool(len(boxes))
+        self.detection_confidence = float(probs.max()) if len(probs) else 0.0
+
+        # Faces already identified in earlier frames keep their embedding
+        tracks = self.tracker.update(boxes, probs)
+        stale = self.tracker.stale(tracks)
+        if stale:
+            embeddings = embed_face_boxes(frame, [track.box for track in stale])
+            for track, embedding in zip(stale, embeddings):
+                match_found, distance, student = self.matcher(embedding)
+                self.tracker.record(track, embedding, match_found, distance, student)
+        self.last_distance = min((track.distance for track in tracks), default=float('inf'))
+
+        for track in tracks:
+            if track.confirmed and track.student["Matric No"] not in self._marked:
+                self._confirm(track.student)
+
+    def _confirm(self, student: dict):
+        success, message = log_attendance(student["Name"], student["Matric No"])
+        self._marked.add(student["Matric No"])
+        self.events.appendleft({
+            "time": time.strftime("%H:%M:%S"),
+            "student": student,
+            "success": success,
+            "message": message
+        })
+        logger.info(f"Stream recognised {student['Matric No']}: {message}")
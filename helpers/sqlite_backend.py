@@ -0,0 +1,246 @@
+import logging
+import sqlite3
+import threading
+from typing import List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import ATTENDANCE_COLUMNS, EMBEDDING_DIM, SQLITE_DB, STUDENT_COLUMNS
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    matric_no TEXT NOT NULL UNIQUE,
+    department TEXT NOT NULL,
+    image_path TEXT,
+    embedding BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    matric_no TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    status TEXT NOT NULL,
+    UNIQUE (matric_no, date, status)
+);
+CREATE TABLE IF NOT EXISTS student_samples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    matric_no TEXT NOT NULL REFERENCES students (matric_no),
+    embedding BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_samples_matric ON student_samples (matric_no);
+CREATE INDEX IF NOT EXISTS idx_attendance_matric ON attendance (matric_no);
+CREATE INDEX IF NOT EXISTS idx_attendance_date_status ON attendance (date, status);
+"""
+
+STUDENT_SQL_COLUMNS = ["name", "matric_no", "department", "image_path"]
+ATTENDANCE_SQL_COLUMNS = ["name", "matric_no", "date", "time", "status"]
+
+
+def _embedding_blob(embedding) -> bytes:
+    vector = np.asarray(embedding, dtype=np.float32).reshape(EMBEDDING_DIM)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tobytes()
+
+
+class SqliteBackend:
+    """Students and attendance in one SQLite database in WAL mode"""
+
+    def __init__(self, path=SQLITE_DB):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """One connection per thread, as sqlite3 connections are not shareable"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load_students(self) -> pd.DataFrame:
+        rows = self.connection().execute(
+            f"SELECT {', '.join(STUDENT_SQL_COLUMNS)} FROM students ORDER BY id"
+        ).fetchall()
+        return pd.DataFrame(rows, columns=STUDENT_COLUMNS)
+
+    def load_embeddings(self) -> np.ndarray:
+        rows = self.connection().execute("SELECT embedding FROM students ORDER BY id").fetchall()
+        buffer = b"".join(row[0] for row in rows)
+        return np.frombuffer(buffer, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+
+    def load_samples(self) -> Tuple[List[str], np.ndarray]:
+        rows = self.connection().execute(
+            "SELECT matric_no, embedding FROM student_samples ORDER BY id"
+        ).fetchall()
+        buffer = b"".join(row[1] for row in rows)
+        return [row[0] for row in rows], np.frombuffer(buffer, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+
+    def read_students_since(self, last_id: int) -> Tuple[pd.DataFrame, np.ndarray, int]:
+        """Students inserted after row `last_id` with their embeddings, and the id to resume from"""
+        conn = self.connection()
+        if last_id > (conn.execute("SELECT MAX(id) FROM students").fetchone()[0] or 0):
+            raise ValueError("Students table is behind the given id")
+        rows = conn.execute(
+            f"SELECT id, {', '.join(STUDENT_SQL_COLUMNS)}, embedding FROM students WHERE id > ? ORDER BY id",
+            (last_id,)
+        ).fetchall()
+        if not rows:
+            return pd.DataFrame(columns=STUDENT_COLUMNS), np.empty((0, EMBEDDING_DIM), dtype=np.float32), last_id
+        embeddings = np.frombuffer(b"".join(row[-1] for row in rows), dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        return pd.DataFrame([row[1:-1] for row in rows], columns=STUDENT_COLUMNS), embeddings, rows[-1][0]
+
+    def read_samples_since(self, last_id: int) -> Tuple[List[str], np.ndarray, int]:
+        """Enrolment samples inserted after row `last_id`, and the id to resume from"""
+        conn = self.connection()
+        if last_id > (conn.execute("SELECT MAX(id) FROM student_samples").fetchone()[0] or 0):
+            raise ValueError("Samples table is behind the given id")
+        rows = conn.execute(
+            "SELECT id, matric_no, embedding FROM student_samples WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+        if not rows:
+            return [], np.empty((0, EMBEDDING_DIM), dtype=np.float32), last_id
+        samples = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        return [row[1] for row in rows], samples, rows[-1][0]
+
+    def add_student(self, record: dict, embedding: list, samples=None) -> bool:
+        """Store a student, returning False if the matric number exists"""
+        try:
+            with self.connection() as conn:
+                conn.execute(
+                    "INSERT INTO students (name, matric_no, department, image_path, embedding) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [record[c] for c in STUDENT_COLUMNS] + [_embedding_blob(embedding)]
+                )
+                if samples is not None and len(samples):
+                    conn.executemany(
+                        "INSERT INTO student_samples (matric_no, embedding) VALUES (?, ?)",
+                        [(record["Matric No"], _embedding_blob(sample)) for sample in samples]
+                    )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def add_students(self, records: List[dict], embeddings: np.ndarray) -> List[dict]:
+        """Store many students in one transaction, returning the records actually added"""
+        added = []
+        with self.connection() as conn:
+            for record, embedding in zip(records, embeddings):
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO students (name, matric_no, department, image_path, embedding) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [record[c] for c in STUDENT_COLUMNS] + [_embedding_blob(embedding)]
+                )
+                if cursor.rowcount:
+                    added.append(record)
+        return added
+
+    def add_attendance(self, record: dict) -> bool:
+        """Insert a record, returning False if it was already marked"""
+        try:
+            with self.connection() as conn:
+                conn.execute(
+                    "INSERT INTO attendance (name, matric_no, date, time, status) VALUES (?, ?, ?, ?, ?)",
+                    [record[c] for c in ATTENDANCE_COLUMNS]
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def add_attendance_many(self, records: List[dict]) -> int:
+        """Insert a batch of records in one transaction, skipping any already marked"""
+        with self.connection() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO attendance (name, matric_no, date, time, status) VALUES (?, ?, ?, ?, ?)",
+                ([record[c] for c in ATTENDANCE_COLUMNS] for record in records)
+            )
+            return conn.total_changes - before
+
+    def today_keys(self, today: str) -> Set[Tuple[str, str, str]]:
+        """(matric, date, status) keys already marked on `today`"""
+        rows = self.connection().execute(
+            "SELECT matric_no, date, status FROM attendance WHERE date = ?", (today,)
+        ).fetchall()
+        return set(rows)
+
+    def load_attendance(self) -> pd.DataFrame:
+        rows = self.connection().execute(
+            f"SELECT {', '.join(ATTENDANCE_SQL_COLUMNS)} FROM attendance ORDER BY id"
+        ).fetchall()
+        return pd.DataFrame(rows, columns=ATTENDANCE_COLUMNS)
+
+    def read_attendance_since(self, last_id: int) -> Tuple[pd.DataFrame, int]:
+        """Records inserted after row `last_id`, and the id to resume from"""
+        conn = self.connection()
+        if last_id > (conn.execute("SELECT MAX(id) FROM attendance").fetchone()[0] or 0):
+            raise ValueError("Attendance table is behind the given id")
+        rows = conn.execute(
+            f"SELECT id, {', '.join(ATTENDANCE_SQL_COLUMNS)} FROM attendance WHERE id > ? ORDER BY id",
+            (last_id,)
+        ).fetchall()
+        if not rows:
+            return pd.DataFrame(columns=ATTENDANCE_COLUMNS), last_id
+        return pd.DataFrame([row[1:] for row in rows], columns=ATTENDANCE_COLUMNS), rows[-1][0]
+
+
+def migrate_from_csv(backend: SqliteBackend = None) -> Tuple[bool, str]:
+    """Import the CSV student and attendance files into SQLite"""
+    from helpers.csv_backend import CsvBackend
+
+    backend = backend or SqliteBackend()
+    source = CsvBackend()
+    try:
+        students = source.load_students()
+        embeddings = source.load_embeddings()
+        if len(students) != len(embeddings):
+            return False, f"{len(students)} student rows but {len(embeddings)} embedding rows"
+        owners, samples = source.load_samples()
+        attendance = source.load_attendance()
+
+        with backend.connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO students (name, matric_no, department, image_path, embedding) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    [row[c] for c in STUDENT_COLUMNS] + [_embedding_blob(embeddings[i])]
+                    for i, row in enumerate(students.to_dict("records"))
+                )
+            )
+            # Re-running the import replaces rather than duplicates samples
+            conn.executemany(
+                "DELETE FROM student_samples WHERE matric_no = ?",
+                ((owner,) for owner in set(owners))
+            )
+            conn.executemany(
+                "INSERT INTO student_samples (matric_no, embedding) VALUES (?, ?)",
+                ((owner, _embedding_blob(sample)) for owner, sample in zip(owners, samples))
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO attendance (name, matric_no, date, time, status) "
+                "VALUES (?, ?, ?, ?, ?)",
+                attendance[ATTENDANCE_COLUMNS].astype(str).itertuples(index=False, name=None)
+            )
+        message = f"Imported {len(students)} students and {len(attendance)} attendance records"
+        logger.info(message)
+        return True, message
+
+    except Exception as e:
+        logger.error(f"Error migrating to SQLite: {str(e)}")
+        return False, f"Migration failed: {str(e)}"
+
+
+if __name__ == "__main__":
+    ok, message = migrate_from_csv()
+    print(message)
@@ -1,46 +1,64 @@
 import streamlit as st
-from streamlit_webrtc import webrtc_streamer, VideoTransformerBase
+from streamlit_webrtc import webrtc_streamer, VideoProcessorBase
 import av
 import numpy as np
-import pandas as pd  # Added missing import
-from PIL import Image
-import json
-from scipy.spatial.distance import cosine
+import pandas as pd
 import logging
+import time
 from datetime import datetime, timedelta
-from helpers.face_utils import get_face_embedding
-from helpers.db_utils import load_students, log_attendance
+from helpers.face_utils import scan_face, start_warm_up
+from helpers.db_utils import log_attendance
+from helpers.frame_ingest import FrameIngest
+from helpers.gallery import EmbeddingGallery, get_gallery, get_shard
+from helpers.metrics import increment, start_metrics_server, timed
+from helpers.recognition_pipeline import RecognitionWorker
 from config import FACE_MATCH_THRESHOLD
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Load the face models while the page renders
+start_warm_up()
+start_metrics_server()
+
 # Initialize session state
 if 'last_attendance_time' not in st.session_state:
     st.session_state.last_attendance_time = None
 if 'retry_count' not in st.session_state:
     st.session_state.retry_count = 0
 
-class FaceScan(VideoTransformerBase):
-    def __init__(self):
+class FaceScan(VideoProcessorBase):
+    def __init__(self, matcher=None):
+        self.ingest = FrameIngest()
         self.frame = None
         self.face_detected = False
         self.detection_confidence = 0.0
+        # In streaming mode a background worker recognises faces continuously
+        self.worker = RecognitionWorker(matcher).start() if matcher else None
 
-    def transform(self, frame: av.VideoFrame) -> np.ndarray:
-        img = frame.to_ndarray(format="bgr24")
+    def recv(self, frame: av.VideoFrame) -> av.VideoFrame:
+        img = self.ingest.decode(frame)
         self.frame = img
-        return img
+        if self.worker is not None:
+            self.worker.submit(img)
+            self.face_detected = self.worker.face_detected
+            self.detection_confidence = self.worker.detection_confidence
+        # The frame is shown unchanged, so it is not re-encoded
+        return frame
+
+    def on_ended(self):
+        if self.worker is not None:
+            self.worker.stop()
 
 def load_student_database():
-    """Load and prepare student database"""
+    """Shared student gallery, loaded once per process and kept current in the background"""
     try:
-        df = load_students()
-        if df.empty:
+        gallery = get_gallery()
+        if len(gallery) == 0:
             st.warning("No students registered in the database.")
             return None
-        return df
+        return gallery
     except Exception as e:
         logger.error(f"Error loading student database: {str(e)}")
         st.error("Failed to load student database.")
@@ -55,47 +73,95 @@ def check_attendance_cooldown() -> bool:
             return False
     return True
 
-def find_matching_student(embedding: np.ndarray, students_df: pd.DataFrame):
-    """Find matching student from embedding"""
+def find_matching_student(embedding: np.ndarray, gallery: EmbeddingGallery,
+                          shard: EmbeddingGallery = None):
+    """Find matching student from embedding, trying the session's shard first"""
     try:
-        min_dist = float('inf')
-        matched_student = None
-
-        for _, row in students_df.iterrows():
-            known_emb = np.array(json.loads(row["Embedding"]))
-            dist = cosine(embedding, known_emb)
-            if dist < min_dist:
-                min_dist = dist
-                matched_student = row
+        with timed("gallery_search"):
+            matched_student, min_dist = None, float('inf')
+            if shard is not None:
+                matched_student, min_dist = shard.best_match(embedding)
+            if min_dist >= FACE_MATCH_THRESHOLD:
+                matched_student, min_dist = gallery.best_match(embedding)
 
         if min_dist < FACE_MATCH_THRESHOLD:
             return True, min_dist, matched_student
+        increment("no_match")
         return False, min_dist, None
 
     except Exception as e:
         logger.error(f"Error in face matching: {str(e)}")
         return False, float('inf'), None
 
+def show_stream_status(ctx):
+    """Poll the recognition worker while the stream is playing"""
+    status = st.empty()
+    events = st.empty()
+    while ctx.state.playing and ctx.video_processor:
+        worker = ctx.video_processor.worker
+        if worker.face_detected:
+            status.info(f"Face detected (confidence {worker.detection_confidence:.2f})")
+        else:
+            status.write("Waiting for a face...")
+
+        with events.container():
+            for event in list(worker.events):
+                name = event["student"]["Name"]
+                if event["success"]:
+                    st.success(f"✅ {event['time']} Welcome {name}! Attendance marked successfully.")
+                else:
+                    st.warning(f"{event['time']} {name}: {event['message']}")
+        time.sleep(0.5)
+
+def select_session_scope(gallery: EmbeddingGallery):
+    """Let the kiosk narrow matching to some departments or a course roster"""
+    st.sidebar.header("🎯 Session Scope")
+    departments = sorted({str(s["Department"]) for s in gallery.students})
+    selected = st.sidebar.multiselect("Departments in this session", departments)
+    roster_file = st.sidebar.file_uploader("Course roster (CSV with a 'Matric No' column)", type="csv")
+
+    roster = []
+    if roster_file is not None:
+        try:
+            roster = pd.read_csv(roster_file)["Matric No"].astype(str).str.strip().tolist()
+        except Exception as e:
+            logger.error(f"Error reading roster: {str(e)}")
+            st.sidebar.error("Could not read the roster file.")
+
+    shard = get_shard(selected, roster)
+    if shard is not None:
+        st.sidebar.info(f"Searching {len(shard)} students first, then everyone else.")
+    return shard
+
 def main():
     st.title("📸 Mark Attendance")
     st.write("Please ensure good lighting and face the camera directly.")
 
     # Load student database
-    students_df = load_student_database()
-    if students_df is None:
+    gallery = load_student_database()
+    if gallery is None:
         return
 
+    shard = select_session_scope(gallery)
+
+    streaming = st.checkbox("Continuous recognition (mark attendance automatically)")
+    matcher = lambda emb: find_matching_student(emb, gallery, shard)
+
     # Video stream
     ctx = webrtc_streamer(
-        key="attendance",
-        video_transformer_factory=FaceScan,
+        key="attendance-stream" if streaming else "attendance",
+        video_processor_factory=(lambda: FaceScan(matcher)) if streaming else FaceScan,
         media_stream_constraints={"video": True, "audio": False},
         async_processing=True
     )
 
-    if ctx.video_transformer:
+    if streaming:
+        show_stream_status(ctx)
+        return
+
+    if ctx.video_processor:
         # Show face detection status
-        if hasattr(ctx.video_transformer, 'face_detected') and ctx.video_transformer.face_detected:
+        if hasattr(ctx.video_processor, 'face_detected') and ctx.video_processor.face_detected:
             st.info("Face detected! You can mark attendance now.")
         
         if st.button("✅ Scan Face and Mark Attendance"):
@@ -103,23 +169,23 @@ def main():
                 return
 
             try:
-                frame = ctx.video_transformer.frame
+                frame = ctx.video_processor.frame
                 if frame is None:
                     st.error("No frame captured. Please ensure your camera is working.")
                     return
 
                 # Get face embedding
-                emb = get_face_embedding(frame)
+                emb, reason = scan_face(frame)
                 if emb is None:
                     st.session_state.retry_count += 1
-                    st.error("⚠️ No face detected. Please ensure your face is clearly visible.")
+                    st.error(f"⚠️ {reason}. Please ensure your face is clearly visible.")
                     if st.session_state.retry_count >= 3:
                         st.error("Multiple failed attempts. Please check lighting and face position.")
                         st.session_state.retry_count = 0
                     return
 
                 # Find matching student
-                match_found, distance, matched_student = find_matching_student(emb, students_df)
+                match_found, distance, matched_student = find_matching_student(emb, gallery, shard)
 
                 if match_found:
                     name = matched_student["Name"]
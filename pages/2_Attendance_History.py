@@ -2,39 +2,53 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime
+from datetime import timedelta
 import logging
-from helpers.db_utils import load_attendance
+import os
+import tempfile
+from pathlib import Path
+from config import EXPORT_DIR, EXPORT_MAX_AGE, EXPORT_URL
+from helpers.analytics import get_analytics
+from helpers.export import EXPORT_FORMATS, EXPORT_MODES, remove_stale_exports, write_export
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def load_and_prepare_data():
-    """Load and prepare attendance data"""
-    try:
-        df = load_attendance()
-        if df.empty:
-            return False, "No attendance records available.", None
-        
-        # Convert date and time columns
-        df['Date'] = pd.to_datetime(df['Date'])
-        df['Time'] = pd.to_datetime(df['Time'], format='%H:%M:%S').dt.time
-        df['Day'] = df['Date'].dt.day_name()
-        
-        return True, "", df
-    except Exception as e:
-        logger.error(f"Error loading attendance data: {str(e)}")
-        return False, f"Error loading attendance data: {str(e)}", None
+DEFAULT_RANGE_DAYS = 30
+
+def prepare_records(df: pd.DataFrame) -> pd.DataFrame:
+    """Parse dates once per cached partition read"""
+    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
+    df['Time'] = pd.to_datetime(df['Time'], format='%H:%M:%S').dt.time
+    return df
+
+@st.cache_data(show_spinner=False)
+def load_daily_counts(version: int) -> pd.DataFrame:
+    """Daily aggregates; `version` is the aggregate file mtime and only keys the cache"""
+    daily = get_analytics().load_daily()
+    daily['Date'] = pd.to_datetime(daily['Date'], format='%Y-%m-%d')
+    return daily
+
+@st.cache_data(show_spinner=False)
+def load_student_names(start: str, end: str, versions: tuple) -> list:
+    """Names seen in the date range, from the per-student aggregates"""
+    totals = get_analytics().load_student_totals(start, end)
+    return sorted(totals["Name"].unique().tolist())
+
+@st.cache_data(show_spinner=False)
+def load_records(start: str, end: str, student: str, versions: tuple) -> pd.DataFrame:
+    """Records for the filters, read from the date partitions in range only"""
+    name = None if student == "All" else student
+    return prepare_records(get_analytics().load_records(start, end, name))
 
-def create_attendance_visualizations(df: pd.DataFrame):
-    """Create attendance visualizations"""
+def create_attendance_visualizations(daily_counts: pd.DataFrame):
+    """Create attendance visualizations from per-day check-in counts"""
     try:
         col1, col2 = st.columns(2)
         
         with col1:
             # Daily attendance trend
-            daily_counts = df.groupby('Date').size().reset_index(name='Count')
             fig_daily = px.line(daily_counts, x='Date', y='Count',
                               title='Daily Attendance Trend',
                               labels={'Count': 'Number of Check-ins'})
@@ -42,52 +56,90 @@ def create_attendance_visualizations(df: pd.DataFrame):
 
         with col2:
             # Weekly pattern
-            weekly_pattern = df.groupby('Day').size()
+            weekly_pattern = daily_counts.groupby(daily_counts['Date'].dt.day_name())['Count'].sum()
             weekly_pattern = weekly_pattern.reindex(['Monday', 'Tuesday', 'Wednesday', 
                                                    'Thursday', 'Friday', 'Saturday', 'Sunday'])
             fig_weekly = px.bar(weekly_pattern, title='Weekly Attendance Pattern',
-                              labels={'value': 'Number of Check-ins', 'Day': 'Day of Week'})
+                              labels={'value': 'Number of Check-ins', 'Date': 'Day of Week'})
             st.plotly_chart(fig_weekly, use_container_width=True)
 
     except Exception as e:
         logger.error(f"Error creating visualizations: {str(e)}")
         st.error("Failed to create visualizations")
 
+def export_section(start: str, end: str, student: str = None):
+    """Build exports on disk chunk by chunk and offer the finished file"""
+    st.header("⬇️ Export")
+    col1, col2 = st.columns(2)
+    with col1:
+        mode = st.selectbox("Contents", EXPORT_MODES,
+                            format_func=lambda m: "Attendance records" if m == "records" else "Attendance % per student")
+    with col2:
+        fmt = st.radio("Format", list(EXPORT_FORMATS), format_func=str.upper, horizontal=True)
+
+    if st.button("Prepare Export"):
+        # Abandoned sessions leave files behind, so anything past its age goes too
+        remove_stale_exports()
+        # One export file per session, replaced on every request
+        previous = st.session_state.pop("export_path", None)
+        if previous:
+            Path(previous).unlink(missing_ok=True)
+        EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        handle, path = tempfile.mkstemp(suffix=f".{fmt}", dir=EXPORT_DIR)
+        os.close(handle)
+        with st.spinner("Writing export..."):
+            success, message = write_export(Path(path), fmt, start, end, student, mode)
+        if success:
+            st.session_state["export_path"] = path
+            st.session_state["export_name"] = f"attendance_{mode}_{start}_{end}.{fmt}"
+            st.success(message)
+        else:
+            Path(path).unlink(missing_ok=True)
+            st.error(message)
+
+    path = st.session_state.get("export_path")
+    if path and Path(path).exists():
+        name = st.session_state["export_name"]
+        # Served straight from disk by Streamlit's static route; the random file name is the only key
+        st.markdown(f'<a href="{EXPORT_URL}/{Path(path).name}" download="{name}">⬇️ Download {name}</a>',
+                    unsafe_allow_html=True)
+        st.caption(f"The file is kept for {EXPORT_MAX_AGE // 60} minutes.")
+
 def main():
     st.title("📋 Attendance History & Analytics")
     
-    # Load data
-    success, message, df = load_and_prepare_data()
-    if not success:
-        st.warning(message)
+    # Fold in anything logged since the last visit
+    analytics = get_analytics()
+    analytics.sync()
+    daily = load_daily_counts(analytics.daily_version())
+    if daily.empty:
+        st.warning("No attendance records available.")
         return
 
     # Sidebar filters
     st.sidebar.header("🔎 Filter Options")
 
-    # Date range filter
+    # Date range filter; the default window keeps the first load small on long histories
+    first_date = daily['Date'].min().date()
+    last_date = daily['Date'].max().date()
     date_range = st.sidebar.date_input(
         "Select Date Range",
-        value=(df['Date'].min(), df['Date'].max()),
-        min_value=df['Date'].min(),
-        max_value=df['Date'].max()
+        value=(max(first_date, last_date - timedelta(days=DEFAULT_RANGE_DAYS - 1)), last_date),
+        min_value=first_date,
+        max_value=last_date
     )
+    start_date, end_date = date_range if len(date_range) == 2 else (first_date, last_date)
+    start, end = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    versions = analytics.partition_versions(start, end)
 
     # Student filter
-    students = ["All"] + sorted(df["Name"].unique().tolist())
+    students = ["All"] + load_student_names(start, end, versions)
     selected_student = st.sidebar.selectbox("Select Student", students)
 
-    # Apply filters
-    filtered_df = df.copy()
-    if len(date_range) == 2:
-        start_date, end_date = date_range
-        filtered_df = filtered_df[
-            (filtered_df['Date'].dt.date >= start_date) & 
-            (filtered_df['Date'].dt.date <= end_date)
-        ]
-    
-    if selected_student != "All":
-        filtered_df = filtered_df[filtered_df["Name"] == selected_student]
+    filtered_df = load_records(start, end, selected_student, versions)
+    if filtered_df.empty:
+        st.info("No attendance records match the selected filters.")
+        return
 
     # Display statistics
     st.header("📊 Attendance Overview")
@@ -101,19 +153,19 @@ def main():
 
     # Visualizations
     st.header("📈 Attendance Analytics")
-    create_attendance_visualizations(filtered_df)
+    if selected_student == "All":
+        in_range = (daily['Date'] >= pd.Timestamp(start_date)) & (daily['Date'] <= pd.Timestamp(end_date))
+        daily_counts = daily.loc[in_range, ['Date', 'Count']]
+    else:
+        daily_counts = filtered_df.groupby('Date').size().reset_index(name='Count')
+    create_attendance_visualizations(daily_counts)
 
     # Detailed Records
     st.header("🧾 Detailed Records")
     st.dataframe(filtered_df[["Name", "Matric No", "Date", "Time", "Status"]], use_container_width=True)
 
     # Export options
-    st.download_button(
-        label="⬇️ Download Records (CSV)",
-        data=filtered_df.to_csv(index=False),
-        file_name=f"attendance_records_{datetime.now().strftime('%Y%m%d')}.csv",
-        mime="text/csv"
-    )
+    export_section(start, end, None if selected_student == "All" else selected_student)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
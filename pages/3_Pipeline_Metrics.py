@@ -0,0 +1,81 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import logging
+from helpers.embedding_cache import get_embedding_cache
+from helpers.metrics import EVENTS, metrics, start_metrics_server
+from config import METRICS_PORT, METRICS_WINDOW
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+start_metrics_server()
+
+EVENT_LABELS = {
+    "no_face": "No Face Detected",
+    "no_match": "No Match Found",
+    "duplicate": "Duplicate Check-ins",
+}
+
+def show_stage_timings(stages: dict):
+    """Latency table and percentile chart per pipeline stage"""
+    df = pd.DataFrame.from_dict(stages, orient="index")
+    df.index.name = "Stage"
+    df = df.reset_index()
+
+    fig = px.bar(df.melt(id_vars="Stage", value_vars=["p50_ms", "p95_ms", "p99_ms"],
+                         var_name="Percentile", value_name="Latency (ms)"),
+                 x="Stage", y="Latency (ms)", color="Percentile", barmode="group",
+                 title="Stage Latency")
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(
+        df.rename(columns={"count": "Calls", "p50_ms": "p50 (ms)", "p95_ms": "p95 (ms)",
+                           "p99_ms": "p99 (ms)", "mean_ms": "Mean (ms)"}).round(2),
+        use_container_width=True
+    )
+
+def main():
+    st.title("⏱️ Pipeline Metrics")
+    st.write(f"Percentiles cover the last {METRICS_WINDOW} calls of each stage in this server process.")
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.button("🔄 Refresh")
+    with col2:
+        if st.button("🗑️ Reset Metrics"):
+            metrics.reset()
+
+    snapshot = metrics.snapshot()
+
+    st.header("🚦 Events")
+    columns = st.columns(len(EVENTS))
+    for column, event in zip(columns, EVENTS):
+        with column:
+            st.metric(EVENT_LABELS.get(event, event), snapshot["events"].get(event, 0))
+
+    st.header("📊 Stage Timings")
+    if not snapshot["stages"]:
+        st.info("No timings recorded yet. Scan a face to populate this page.")
+    else:
+        show_stage_timings(snapshot["stages"])
+
+    cache = get_embedding_cache()
+    if cache is not None:
+        st.header("🗃️ Embedding Cache")
+        stats = cache.stats()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Hit Rate", f"{stats['hit_rate']:.1%}")
+        with col2:
+            st.metric("Hits (memory / disk)", f"{stats['hits']} / {stats['disk_hits']}")
+        with col3:
+            st.metric("Cached Embeddings", stats["entries"])
+
+    st.caption(f"Collecting for {snapshot['uptime_s'] / 60:.1f} minutes")
+    if METRICS_PORT:
+        st.caption(f"Prometheus metrics are served on port {METRICS_PORT} at /metrics")
+
+if __name__ == "__main__":
+    main()
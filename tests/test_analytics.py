@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from helpers import analytics
+from helpers.analytics import AttendanceAnalytics
+
+
+@pytest.fixture
+def source(monkeypatch):
+    """Attendance rows served to sync() with row-count cursors, as the CSV backend does"""
+    rows = pd.DataFrame([
+        {"Name": f"Student {i}", "Matric No": f"U21/ENG/CSC/{i:04d}", "Date": "2024-03-01",
+         "Time": "09:00:00", "Status": "Present"}
+        for i in range(3)
+    ])
+    monkeypatch.setattr(analytics, "read_attendance_since",
+                        lambda cursor: (rows.iloc[cursor:], len(rows)))
+    return rows
+
+
+def test_sync_after_failed_cursor_save_keeps_rows_once(tmp_path, source, monkeypatch):
+    store = AttendanceAnalytics(root=tmp_path / "analytics")
+    save_cursor = store._save_cursor
+    calls = []
+
+    def fail_once(cursor):
+        calls.append(cursor)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        save_cursor(cursor)
+
+    # Partitions and daily.parquet are written, then the cursor save fails
+    monkeypatch.setattr(store, "_save_cursor", fail_once)
+    assert store.sync() == 0
+    assert store.sync() == 3
+
+    assert len(store.load_records("2024-03-01", "2024-03-01")) == 3
+    daily = store.load_daily()
+    assert daily["Count"].tolist() == [3]
+    assert daily["Unique Students"].tolist() == [3]
+    assert store.sync() == 0
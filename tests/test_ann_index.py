@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from config import EMBEDDING_DIM
+from helpers import ann_index
+from helpers.ann_index import _assign, fingerprint, load_or_build
+from helpers.gallery import _normalize
+
+
+@pytest.fixture(autouse=True)
+def ivf(monkeypatch):
+    monkeypatch.setattr(ann_index, "ANN_BACKEND", "ivf")
+
+
+def _rows(count: int, seed: int) -> np.ndarray:
+    return _normalize(np.random.default_rng(seed).standard_normal((count, EMBEDDING_DIM)))
+
+
+def _labels(index) -> np.ndarray:
+    labels = np.empty(index.size, dtype=np.int32)
+    for label, ids in enumerate(index.lists):
+        labels[ids] = label
+    return labels
+
+
+def test_index_of_rewritten_store_is_rebuilt(tmp_path):
+    path = tmp_path / "students.ann"
+    load_or_build(_rows(400, seed=0), path)
+
+    # Same row count, different students: the saved lists point at the wrong rows
+    rewritten = _rows(400, seed=1)
+    index = load_or_build(rewritten, path)
+    assert index.fingerprint == fingerprint(rewritten, len(rewritten))
+    assert np.array_equal(_labels(index), _assign(rewritten, index.centroids))
+
+
+def test_saved_index_is_reused_and_topped_up(tmp_path):
+    path = tmp_path / "students.ann"
+    matrix = _rows(500, seed=0)
+    built = load_or_build(matrix[:400], path)
+
+    index = load_or_build(matrix, path)
+    assert np.array_equal(index.centroids, built.centroids)
+    assert index.size == 500
+    assert np.array_equal(_labels(index)[400:], _assign(matrix[400:], built.centroids))
+
+
+def test_rows_normalised_again_keep_the_fingerprint(tmp_path):
+    path = tmp_path / "students.ann"
+    matrix = _rows(400, seed=0)
+    built = load_or_build(matrix, path)
+
+    # The gallery normalises rows it adds, which must not look like a rewritten store
+    index = load_or_build(_normalize(matrix), path)
+    assert np.array_equal(index.centroids, built.centroids)
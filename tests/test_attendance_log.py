@@ -0,0 +1,45 @@
+import csv
+from datetime import date, timedelta
+
+from config import ATTENDANCE_COLUMNS
+from helpers.attendance_log import _TAIL_BLOCK, AttendanceLog
+
+
+def _record(i: int, day: str) -> dict:
+    return {"Name": f"Student {i}", "Matric No": f"U21/ENG/CSC/{i:04d}",
+            "Date": day, "Time": "09:00:00", "Status": "Check-In"}
+
+
+def _write(path, records):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, ATTENDANCE_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def test_today_keys_before_replayed_older_records_are_found(tmp_path):
+    today = date.today().isoformat()
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    path = tmp_path / "attendance.csv"
+    # Yesterday's history, today's check-ins, then a journal replay of yesterday's records
+    _write(path, [_record(i, yesterday) for i in range(3000)]
+           + [_record(1, today)]
+           + [_record(i, yesterday) for i in range(3000, 3010)])
+    log = AttendanceLog(path=path)
+
+    assert log.today_keys(today) == {("U21/ENG/CSC/0001", today, "Check-In")}
+    assert not log.append(_record(1, today))
+    log.close()
+
+
+def test_scan_stops_after_a_block_of_older_records(tmp_path):
+    today = date.today().isoformat()
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    path = tmp_path / "attendance.csv"
+    older = [_record(i, yesterday) for i in range(2 * _TAIL_BLOCK // 40)]
+    # The scan stays bounded: today's rows above a whole block of older ones are not read
+    _write(path, [_record(1, today)] + older)
+    log = AttendanceLog(path=path)
+
+    assert log.today_keys(today) == set()
+    log.close()
@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import signal
+
+import pytest
+
+from helpers.attendance_queue import AttendanceQueue
+
+
+class MemoryBackend:
+    """Just the attendance calls the queue makes, keeping keys unique as the real backends do"""
+
+    def __init__(self):
+        self.records = []
+
+    def _keys(self):
+        return {(r["Matric No"], r["Date"], r["Status"]) for r in self.records}
+
+    def add_attendance_many(self, records):
+        keys, added = self._keys(), 0
+        for record in records:
+            key = (record["Matric No"], record["Date"], record["Status"])
+            if key not in keys:
+                keys.add(key)
+                self.records.append(dict(record))
+                added += 1
+        return added
+
+    def today_keys(self, today):
+        return {key for key in self._keys() if key[1] == today}
+
+
+def _record(i: int) -> dict:
+    return {"Name": f"Student {i}", "Matric No": f"U21/ENG/CSC/{i:04d}",
+            "Date": "2024-03-01", "Time": "09:00:00", "Status": "Check-In"}
+
+
+def _open_queue(backend, tmp_path) -> AttendanceQueue:
+    # Flushed only when a test asks for it
+    return AttendanceQueue(backend, tmp_path / "attendance.journal",
+                           flush_batch=1000, flush_interval=3600)
+
+
+def _enqueue_and_die(journal_dir):
+    queue = _open_queue(MemoryBackend(), journal_dir)
+    queue.enqueue(_record(1))
+    queue.enqueue(_record(2))
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+@pytest.fixture
+def queues():
+    opened = []
+    yield opened
+    for queue in opened:
+        queue.close()
+
+
+def test_journal_of_killed_process_is_replayed(tmp_path, queues):
+    child = multiprocessing.get_context("fork").Process(target=_enqueue_and_die, args=(tmp_path,))
+    child.start()
+    child.join()
+    assert child.exitcode == -signal.SIGKILL
+
+    backend = MemoryBackend()
+    queue = _open_queue(backend, tmp_path)
+    queues.append(queue)
+    assert [r["Matric No"] for r in backend.records] == ["U21/ENG/CSC/0001", "U21/ENG/CSC/0002"]
+    # Only the new queue's own journal is left
+    assert list(tmp_path.glob("attendance.*.journal*")) == [queue.journal_path]
+
+
+def test_queues_keep_separate_journals(tmp_path, queues):
+    backend = MemoryBackend()
+    first = _open_queue(backend, tmp_path)
+    queues.append(first)
+    assert first.enqueue(_record(1))
+
+    # A second queue must neither replay nor remove a journal whose owner is running
+    second = _open_queue(backend, tmp_path)
+    queues.append(second)
+    assert second.journal_path != first.journal_path
+    assert backend.records == []
+    assert first.journal_path.read_text().count("\n") == 1
+
+    assert second.enqueue(_record(2))
+    second.flush()
+    assert [r["Matric No"] for r in backend.records] == ["U21/ENG/CSC/0002"]
+    first.flush()
+    assert len(backend.records) == 2
+
+
+def test_replay_after_partial_flush_writes_each_record_once(tmp_path, queues):
+    backend = MemoryBackend()
+    queue = _open_queue(backend, tmp_path)
+    queue.enqueue(_record(1))
+    queue.flush()
+    queue.enqueue(_record(2))
+    # Simulate a crash: the owner lock goes away without a final flush
+    queue._stopped = True
+    queue._owner_lock.close()
+
+    queues.append(_open_queue(backend, tmp_path))
+    assert sorted(r["Matric No"] for r in backend.records) == ["U21/ENG/CSC/0001", "U21/ENG/CSC/0002"]
+
+
+def test_duplicates_are_rejected_from_the_days_keys(tmp_path, queues):
+    backend = MemoryBackend()
+    backend.add_attendance_many([_record(1)])
+    queue = _open_queue(backend, tmp_path)
+    queues.append(queue)
+    assert not queue.enqueue(_record(1))
+
+    # Keys are loaded once per day, so later check-ins never read storage
+    backend.today_keys = None
+    assert not queue.enqueue(_record(1))
+    assert queue.enqueue(_record(2))
+    assert not queue.enqueue(_record(2))
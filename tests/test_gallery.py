@@ -0,0 +1,144 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import EMBEDDING_DIM
+from helpers import gallery as gallery_module
+from helpers.gallery import EmbeddingGallery, ReadWriteLock, _normalize
+
+
+def _store(students):
+    """Student rows and one-hot embeddings, student i pointing along axis i"""
+    df = pd.DataFrame([{"Name": name, "Matric No": f"U21/ENG/CSC/{i:04d}", "Department": "CSC",
+                        "Image Path": ""} for i, name in students])
+    matrix = np.zeros((len(students), EMBEDDING_DIM), dtype=np.float32)
+    for row, (i, _) in enumerate(students):
+        matrix[row, i] = 1.0
+    return df, matrix
+
+
+def _axis(i: int) -> np.ndarray:
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def test_writer_waits_for_readers_and_holds_off_new_ones():
+    lock = ReadWriteLock()
+    written, read = threading.Event(), threading.Event()
+
+    def write():
+        with lock.write():
+            written.set()
+
+    def read_later():
+        with lock.read():
+            read.set()
+
+    with lock.read():
+        threading.Thread(target=write).start()
+        assert not written.wait(0.1)
+        # A reader arriving while the writer waits would starve it, so it is held back
+        threading.Thread(target=read_later).start()
+        assert not read.wait(0.1)
+    assert written.wait(1)
+    assert read.wait(1)
+
+
+def test_store_rows_are_kept_bit_for_bit():
+    rows = _normalize(np.random.default_rng(0).standard_normal((64, EMBEDDING_DIM)))
+    assert np.array_equal(_normalize(rows), rows)
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    """Process-wide gallery over students A and C, with a CSC shard"""
+    df, matrix = _store([(0, "A"), (2, "C")])
+    shared = EmbeddingGallery.from_store(df, matrix, use_index=False)
+    shard = shared.subset(lambda record: True)
+    monkeypatch.setattr(gallery_module, "_gallery", shared)
+    monkeypatch.setattr(gallery_module, "_shards",
+                        OrderedDict({(frozenset({"csc"}), frozenset()): shard}))
+    monkeypatch.setattr(gallery_module, "_student_cursor", 2)
+    monkeypatch.setattr(gallery_module, "_sample_cursor", 0)
+    return shared, shard
+
+
+def test_reload_after_store_rewrite_never_serves_an_empty_gallery(shared, monkeypatch):
+    gallery, shard = shared
+    rewritten = _store([(0, "A"), (1, "B")])
+    seen = []
+
+    def look():
+        # Student A is in both the old and the rewritten store
+        seen.append(gallery.best_match(_axis(0))[0])
+        seen.append(shard.best_match(_axis(0))[0])
+
+    def read_students_since(cursor):
+        if cursor:
+            raise ValueError("store shrank")
+        look()
+        return (*rewritten, 2)
+
+    def read_samples_since(cursor):
+        look()
+        return [], np.empty((0, EMBEDDING_DIM), dtype=np.float32), 0
+
+    monkeypatch.setattr(gallery_module, "read_students_since", read_students_since)
+    monkeypatch.setattr(gallery_module, "read_samples_since", read_samples_since)
+
+    assert gallery_module.refresh_gallery() == 2
+    look()
+    assert [student and student["Name"] for student in seen] == ["A"] * len(seen)
+    for searched in (gallery, shard):
+        assert searched.best_match(_axis(1))[0]["Name"] == "B"
+        assert not searched.contains("U21/ENG/CSC/0002")
+
+
+def test_refresh_adds_new_students_to_gallery_and_shards(shared, monkeypatch):
+    gallery, shard = shared
+    added = _store([(1, "B")])
+    monkeypatch.setattr(gallery_module, "read_students_since", lambda cursor: (*added, cursor + 1))
+    monkeypatch.setattr(gallery_module, "read_samples_since",
+                        lambda cursor: ([], np.empty((0, EMBEDDING_DIM), dtype=np.float32), cursor))
+
+    assert gallery_module.refresh_gallery() == 1
+    assert gallery_module.refresh_gallery() == 0
+    assert len(gallery) == 3 and len(shard) == 3
+    assert shard.best_match(_axis(1))[0]["Name"] == "B"
+
+
+class _WrongCandidates:
+    """ANN stand-in that only ever offers row 1"""
+
+    def candidates(self, query):
+        return np.array([1])
+
+
+def _between(cos_a: float, i: int, cos_b: float, j: int) -> np.ndarray:
+    query = cos_a * _axis(i) + cos_b * _axis(j)
+    query[EMBEDDING_DIM - 1] = np.sqrt(1.0 - cos_a ** 2 - cos_b ** 2)
+    return query
+
+
+def test_exact_fallback_only_just_past_the_threshold(monkeypatch):
+    gallery = EmbeddingGallery.from_store(*_store([(0, "A"), (1, "B"), (2, "C")]), use_index=False)
+    gallery.index = _WrongCandidates()
+    exact_scans = []
+    search = gallery.search
+    monkeypatch.setattr(gallery, "search", lambda embedding, k=1, exact=False: (
+        exact_scans.append(exact) or search(embedding, k, exact)))
+
+    # ANN offers B at 0.6, just past the threshold; the exact scan finds A at 0.5
+    student, distance = gallery.best_match(_between(0.5, 0, 0.4, 1))
+    assert student["Name"] == "A" and distance == pytest.approx(0.5)
+    assert exact_scans == [False, True]
+
+    # A clear non-match costs one ANN probe and no scan
+    exact_scans.clear()
+    student, distance = gallery.best_match(_between(0.2, 1, 0.1, 2))
+    assert distance == pytest.approx(0.8)
+    assert exact_scans == [False]